@@ -16,9 +16,59 @@ class Settings(BaseSettings):
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
     tg_token: str = os.getenv("TG_TOKEN")
     chan_id: str = os.getenv("CHAN_ID")
-    rate_limit: str = os.getenv("RATE_LIMIT")
+    rate_limit: str = os.getenv("RATE_LIMIT", "")
+    rate_limit_strategy: str = os.getenv("RATE_LIMIT_STRATEGY", "")
+    rate_limit_account: str = os.getenv("RATE_LIMIT_ACCOUNT", "")
+    rate_limit_store: str = os.getenv("RATE_LIMIT_STORE", "")
+    rate_limit_max_keys: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
     api_key: str = os.getenv("API_KEY")
-    admin_api_key: str = os.getenv("ADMIN_API_KEY")    
+    admin_api_key: str = os.getenv("ADMIN_API_KEY")
+    max_concurrent_orders: int = int(os.getenv("MAX_CONCURRENT_ORDERS", "10"))
+    mt5_health_check_interval: float = float(os.getenv("MT5_HEALTH_CHECK_INTERVAL", "5"))
+    mt5_terminal_paths: str = os.getenv("MT5_TERMINAL_PATHS", "")
+    terminal_call_timeout: float = float(os.getenv("TERMINAL_CALL_TIMEOUT", "120"))
+    order_max_attempts: int = int(os.getenv("ORDER_MAX_ATTEMPTS", "5"))
+    order_deadline: float = float(os.getenv("ORDER_DEADLINE", "10"))
+    order_backoff_base: float = float(os.getenv("ORDER_BACKOFF_BASE", "0.05"))
+    order_backoff_max: float = float(os.getenv("ORDER_BACKOFF_MAX", "1"))
+    quote_max_age: float = float(os.getenv("QUOTE_MAX_AGE", "0.5"))
+    quote_refresh_interval: float = float(os.getenv("QUOTE_REFRESH_INTERVAL", "0.25"))
+    quote_idle_timeout: float = float(os.getenv("QUOTE_IDLE_TIMEOUT", "60"))
+    quote_refresh_max_backoff: float = float(os.getenv("QUOTE_REFRESH_MAX_BACKOFF", "4"))
+    deal_history_days: float = float(os.getenv("DEAL_HISTORY_DAYS", "5"))
+    deal_history_size: int = int(os.getenv("DEAL_HISTORY_SIZE", "100"))
+    ticker_cache_size: int = int(os.getenv("TICKER_CACHE_SIZE", "1000"))
+    ticker_refresh_interval: float = float(os.getenv("TICKER_REFRESH_INTERVAL", "300"))
+    account_cache_ttl: float = float(os.getenv("ACCOUNT_CACHE_TTL", "60"))
+    mongo_max_pool_size: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+    mongo_min_pool_size: int = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    mongo_max_idle_time_ms: int = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+    mongo_wait_queue_timeout_ms: int = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+    mongo_server_selection_timeout_ms: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    mongo_connect_timeout_ms: int = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    mongo_socket_timeout_ms: int = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+    mongo_write_concern: str = os.getenv("MONGO_WRITE_CONCERN", "1")
+    mongo_read_concern: str = os.getenv("MONGO_READ_CONCERN", "local")
+    mongo_read_preference: str = os.getenv("MONGO_READ_PREFERENCE", "primary")
+    write_batch_size: int = int(os.getenv("WRITE_BATCH_SIZE", "100"))
+    write_flush_interval: float = float(os.getenv("WRITE_FLUSH_INTERVAL", "0.1"))
+    position_book_refresh_interval: float = float(os.getenv("POSITION_BOOK_REFRESH_INTERVAL", "60"))
+    reconcile_interval: float = float(os.getenv("RECONCILE_INTERVAL", "60"))
+    reconcile_batch_size: int = int(os.getenv("RECONCILE_BATCH_SIZE", "50"))
+    reconcile_concurrency: int = int(os.getenv("RECONCILE_CONCURRENCY", "5"))
+    idempotency_ttl: int = int(os.getenv("IDEMPOTENCY_TTL", "300"))
+    idempotency_cache_size: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    idempotency_wait_timeout: float = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "30"))
+    warmup_accounts: str = os.getenv("WARMUP_ACCOUNTS", "none")
+    warmup_timeout: float = float(os.getenv("WARMUP_TIMEOUT", "120"))
+    job_workers: int = int(os.getenv("JOB_WORKERS", "8"))
+    job_stale_after: float = float(os.getenv("JOB_STALE_AFTER", "600"))
+    job_poll_interval: float = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+    job_lease_ttl: float = float(os.getenv("JOB_LEASE_TTL", "15"))
+    telegram_queue_size: int = int(os.getenv("TELEGRAM_QUEUE_SIZE", "1000"))
+    telegram_batch_window: float = float(os.getenv("TELEGRAM_BATCH_WINDOW", "1"))
+    telegram_max_retries: int = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+    telegram_timeout: float = float(os.getenv("TELEGRAM_TIMEOUT", "10"))
     class Config:
         env_file = ".env"
 
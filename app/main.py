@@ -1,6 +1,18 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from routes.trading_routes import router as tradingrouter
-from utils.mongo import mongo
+from utils.mongo import mongo, pool_stats
+from models.brokers import session_manager, mt5_busy, mt5_executor, run_in_mt5, refresh_quotes
+from models.terminal_pool import terminal_pool
+from utils.tick_cache import quote_cache
+from utils.ticker_cache import ticker_cache
+from utils.write_behind import trade_writer
+from utils.telegram_bot import notifier
+from utils.position_book import position_book
+from utils.reconciler import reconciler
+from utils.jobs import job_queue
+from utils.metrics import Gauge, registry
+from utils.warmup import warmup
 import logging
 from dotenv import load_dotenv
 import os
@@ -16,12 +28,41 @@ load_dotenv()
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting up and connecting to MongoDB")
-    # MongoDB connection is already initialized in the mongo module
+    # With terminal paths configured every MT5 call goes to the terminal worker processes
+    terminal_pool.start()
+    if terminal_pool.enabled:
+        quote_cache.start(terminal_pool.refresh_quotes, terminal_pool.busy)
+    else:
+        quote_cache.start(refresh_quotes, mt5_busy)
+    # Indexes, the Mongo pool, tickers, accounts and open positions load in
+    # parallel; if Mongo is down the worker starts anyway and /ready stays 503
+    await warmup.preload()
+    ticker_cache.start()
+    trade_writer.start()
+    # Flush local writes first so a reload never drops trades still in the buffer
+    position_book.start(before_load=trade_writer.flush)
+    reconciler.start()
+    job_queue.start()
+    notifier.start()
+    # Account logins run in the background, /ready holds traffic until they finish
+    warmup.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     logger.info("Shutting down and closing MongoDB connection")
+    await warmup.stop()
+    # Pending trade writes must reach MongoDB before the client closes
+    await job_queue.stop()
+    await reconciler.stop()
+    await position_book.stop()
+    await trade_writer.stop()
     await mongo.close()
+    await notifier.stop()
+    await quote_cache.stop()
+    await ticker_cache.stop()
+    await terminal_pool.stop()
+    await run_in_mt5(session_manager.shutdown)
+    mt5_executor.shutdown(wait=False)
 
 
 @app.get("/")
@@ -29,6 +70,35 @@ async def root():
     return {"message": "Welcome to the Template Microservice v0.1.10"}
 
 
+@app.get("/ready")
+async def readiness():
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+
+@app.get("/status/notifications")
+async def notification_status():
+    return notifier.stats()
+
+
+@app.get("/status/mongo")
+async def mongo_pool_status():
+    return pool_stats.snapshot()
+
+
+registry.register(Gauge("telegram_queue_depth", "Notifications waiting to be sent", lambda: notifier.queue.qsize()))
+registry.register(Gauge("trade_writes_pending", "Trade writes waiting for the next batch", lambda: len(trade_writer.pending)))
+registry.register(Gauge("mongo_pool_checked_out", "Mongo connections lent to operations", lambda: pool_stats.total("checked_out")))
+registry.register(Gauge("mongo_pool_waiters", "Operations waiting for a Mongo connection", lambda: pool_stats.total("waiters")))
+registry.register(Gauge("job_shards_held", "Job shards this worker runs", lambda: job_queue.shards_held))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition; every web worker keeps its own counters and
+    # folds in those of its terminal workers
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(tradingrouter, prefix="/trade")
 
 
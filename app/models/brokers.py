@@ -1,216 +1,585 @@
 from typing import Dict, Any
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import MetaTrader5 as mt5
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
 import asyncio
+import threading
 import time 
+import uuid
+from collections import namedtuple
+from config import settings
+from utils.deal_history import DealHistory
+from models.order_retry import order_retry_policy
+from utils.metrics import relogins, timed
+from utils.tick_cache import quote_cache
 logger = logging.getLogger(__name__)
 
-class MT5Broker():
-    def __init__(self, username, password, server, suffix=None):
-        self.username = username
-        self.password = password
-        self.server = server
-        self.connected = False
-        self.minlot = self.maxlot = self.decpos = None
+ORDER_MAGIC = 999999
 
+# Stands in for the order_send result of an open found on the account
+# after order_send returned nothing
+RecoveredOrder = namedtuple("RecoveredOrder", "retcode deal order volume price comment")
 
-       
-        self.connect()
+# The MetaTrader5 package drives a single terminal through process-global
+# state, so every MT5 call goes through this one dedicated thread. Blocking
+# terminal work then never runs on the event loop.
+mt5_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mt5")
+mt5_pending = 0
+# Every account on the terminal needs its own login; an order pipeline holds
+# this so one account's calls run back to back instead of between another's
+mt5_session_lock = asyncio.Lock()
 
 
-        
-    def connect( self ):
-        self.connected = False
-        
-        if not mt5.initialize():
-            logger.critical("MT5 initialization failed, unable to connect" )
-            mt5.shutdown()
-            return False
-        if not mt5.login(self.username, self.password, self.server):
-            logger.critical("MT5 login failed, unable to connect")
-            mt5.shutdown()
+async def run_in_mt5(func, *args, **kwargs):
+    global mt5_pending
+    loop = asyncio.get_running_loop()
+    mt5_pending += 1
+    try:
+        return await loop.run_in_executor(mt5_executor, partial(func, *args, **kwargs))
+    finally:
+        mt5_pending -= 1
+
+
+def mt5_busy() -> bool:
+    # Calls queued or running on the MT5 thread
+    return mt5_pending > 0
+
+
+class BrokerBase(ABC):
+    @abstractmethod
+    async def connect(self) -> bool:
+        pass
+
+    @abstractmethod
+    async def get_price(self, symbol: str, side: str) -> float:
+        pass
+
+    @abstractmethod
+    async def market_order(self, symbol: str, side: str, lotsize: float, price: float, sl: float = None, tp: float = None):
+        pass
+
+    @abstractmethod
+    async def close_position(self, symbol: str, deal_id: int, side: str, volume: float, price: float = None):
+        pass
+
+    async def close_positions(self, closes):
+        # Brokers that can close several positions in one round trip override this
+        return [await self.close_position(*close) for close in closes]
+
+    @abstractmethod
+    async def get_balance(self) -> float:
+        pass
+
+    @abstractmethod
+    async def get_last_pnl(self, symbol: str) -> float:
+        pass
+
+
+class MT5SessionManager:
+    """
+    Keeps the MT5 terminal initialised and logged in across requests.
+
+    The MetaTrader5 package drives one terminal per process, so only one
+    account is logged in at a time. Switching accounts is a plain login on the
+    already initialised terminal, and the terminal is only re-initialised when
+    it stops answering. terminal_path picks the terminal installation when
+    several are installed side by side. Orders confirm the logged in account
+    with the terminal right before order_send, since another process attached
+    to the same terminal can switch it between health checks.
+    """
+
+    def __init__(self, health_check_interval: float, terminal_path: str = None):
+        self.health_check_interval = health_check_interval
+        self.terminal_path = terminal_path
+        self.lock = threading.RLock()
+        self.initialized = False
+        self.active_account = None
+        self.last_check = 0.0
+        self.relogins = 0
+        self.brokers = {}
+
+    def get_broker(self, username, password, server):
+        # Reuse the broker object for an account so callers share its session
+        key = (username, server)
+        with self.lock:
+            broker = self.brokers.get(key)
+            if broker is None or broker.password != password:
+                broker = MT5Broker(username, password, server)
+                self.brokers[key] = broker
+            return broker
+
+    def is_alive(self, username) -> bool:
+        terminal = mt5.terminal_info()
+        if terminal is None or not terminal.connected:
             return False
+        account = mt5.account_info()
+        return account is not None and account.login == username
+
+    def wait_connected(self, timeout: float = 60) -> bool:
         #check mt5.terminal_info() and make sure MT5 is connected to the exchange
-        timeout = datetime.now() + timedelta( seconds = 60 )
+        deadline = time.monotonic() + timeout
         while True:
-            data = mt5.terminal_info()._asdict()
-            if data['connected']:
-                self.connected = True
+            terminal = mt5.terminal_info()
+            if terminal is not None and terminal.connected:
                 return True
-            if datetime.now > timeout:
+            if time.monotonic() > deadline:
                 logger.critical("MT5 failed to connect to exchange")
+                return False
+            time.sleep(1)
+
+    def initialize(self) -> bool:
+        with self.lock:
+            if not self.initialized:
+                initialized = mt5.initialize(path=self.terminal_path) if self.terminal_path else mt5.initialize()
+                if not initialized:
+                    logger.critical("MT5 initialization failed, unable to connect")
+                    mt5.shutdown()
+                    return False
+                self.initialized = True
+            return True
+
+    def ensure_session(self, username, password, server) -> bool:
+        key = (username, server)
+        with self.lock:
+            if self.initialized and self.active_account == key:
+                if time.monotonic() - self.last_check < self.health_check_interval:
+                    return True
+                if self.is_alive(username):
+                    self.last_check = time.monotonic()
+                    return True
+                logger.warning(f"MT5 session for account {username} is dead, logging in again")
+
+            if self.initialized and mt5.terminal_info() is None:
+                # The terminal itself went away, start it again
                 mt5.shutdown()
+                self.initialized = False
+
+            if not self.initialize():
                 return False
-            time.sleep( 10 )
 
-    def get_price(self, symbol, side):
+            self.active_account = None
+            with timed("mt5_login", broker="MT5", account=username) as timer:
+                if not mt5.login(username, password, server):
+                    timer.outcome = "failed"
+                    logger.critical(f"MT5 login failed for account {username}, unable to connect")
+                    return False
+            self.relogins += 1
+            relogins.inc(account=username)
+            if not self.wait_connected():
+                return False
+
+            self.active_account = key
+            self.last_check = time.monotonic()
+            return True
+
+    def confirm_account(self, username, password, server) -> bool:
+        # The cached session may be stale if another process logged in to this
+        # terminal; ask the terminal itself and log back in when it switched
+        with self.lock:
+            account = mt5.account_info()
+            if account is not None and account.login == username and account.server == server:
+                return True
+            logger.warning(f"MT5 terminal is not logged in to account {username} before order_send, logging in again")
+            self.active_account = None
+            return self.ensure_session(username, password, server)
+
+    def refresh_quotes(self, keys):
+        # Only refresh symbols on the server that is already logged in, so the
+        # background refresh never forces an account switch
+        refreshed = []
+        with self.lock:
+            if not self.initialized or self.active_account is None:
+                return refreshed
+            server = self.active_account[1]
+            for key_server, symbol in keys:
+                if key_server != server:
+                    continue
+                tick = mt5.symbol_info_tick(symbol)
+                if tick is not None:
+                    quote_cache.put(server, symbol, tick.bid, tick.ask)
+                    refreshed.append((server, symbol, tick.bid, tick.ask))
+        return refreshed
+
+    def invalidate(self):
+        # Force a health check on the next call instead of trusting the session
+        with self.lock:
+            self.last_check = 0.0
+
+    def shutdown(self):
+        with self.lock:
+            if self.initialized:
+                mt5.shutdown()
+            self.initialized = False
+            self.active_account = None
+
+
+session_manager = MT5SessionManager(settings.mt5_health_check_interval)
+
+
+async def refresh_quotes(keys):
+    await run_in_mt5(session_manager.refresh_quotes, keys)
+
+
+class MT5Broker():
+    def __init__(self, username, password, server, suffix=None):
+        self.username = username
+        self.password = password
+        self.server = server
+        self.connected = False
+        self.minlot = self.maxlot = self.decpos = None
+        self.symbol_suffix = suffix or ""
+        self.deal_history = DealHistory(settings.deal_history_days, settings.deal_history_size)
+        # No login here: every call connects first, so creating a broker stays cheap
+
+    def connect( self ):
+        self.connected = session_manager.ensure_session(self.username, self.password, self.server)
+        return self.connected
+
+    def get_quote(self, symbol, max_age=None):
+        # Serve from the shared quote cache unless the cached quote is too old
+        if max_age is None:
+            max_age = settings.quote_max_age
+        quote_cache.watch(self.server, symbol)
+        quote = quote_cache.get(self.server, symbol, max_age)
+        if quote is None:
+            if not self.connect():
+                return None
+
+            try:
+                with timed("symbol_info_tick", broker="MT5", account=self.username, symbol=symbol):
+                    data = mt5.symbol_info_tick(symbol)._asdict()
+                quote = quote_cache.put(self.server, symbol, data['bid'], data['ask'])
+                self.connected = True  # Move this here, as it will be set if no exception occurs
+            except Exception as e:
+                logger.critical(f"MT5 symbol_info_tick() failed: {str(e)}")
+                self.connected = False
+                session_manager.invalidate()
+                return None
+        return quote
+
+    def get_price(self, symbol, side, max_age=None):
+        quote = self.get_quote(symbol, max_age)
+        if quote is None:
+            return None
+
+        price = quote.price(side)
+        if price is None:
+            logger.warning(f"Invalid side: {side}. Returning None.")
+        return price
+
+    def send_open(self, symbol, dir, lotsize, price=None, SL=None, TP=None, max_age=None, comment=None):
+        # One order_send for a market order; without a price the current quote is used
         if not self.connect():
             return None
+        if price is None:
+            price = self.get_price(symbol, dir, max_age)
+            if price is None:
+                return None
+
+        if dir == "buy":
+            order_type = mt5.ORDER_TYPE_BUY
+        else:
+            order_type = mt5.ORDER_TYPE_SELL
 
+        request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": symbol,
+            "volume": lotsize,
+            "type": order_type,
+            "price": price,
+            "sl": SL,
+            "tp": TP,
+            "deviation": int( price / 100 ),
+            "magic": ORDER_MAGIC,
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": mt5.ORDER_FILLING_IOC,
+        }
+        if comment:
+            request["comment"] = comment
+        result = self.send(request)
+        if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+            logger.info(f"Successfully opened trade {symbol} trade size {lotsize:.2f} entry price {price:.2f}")
+        return result
+
+    def send(self, request):
+        # Returns the raw MT5 result; deciding on a retry is up to the async layer
+        logger.debug(f"order_send request for account {self.username}: {request}")
         try:
-            data = mt5.symbol_info_tick(symbol)._asdict()
-            price_bid = float(data['bid'])
-            price_ask = float(data['ask'])
-            
-            self.connected = True  # Move this here, as it will be set if no exception occurs
-            
-            if side.lower() == 'buy':
-                return price_ask
-            elif side.lower() == 'sell':
-                return price_bid
-            else:
-                logger.warning(f"Invalid side: {side}. Returning None.")
-                return None
-            
+            # Holding the session lock keeps the confirmed login in place until the order is sent
+            with session_manager.lock:
+                if not session_manager.confirm_account(self.username, self.password, self.server):
+                    return None
+                with timed("order_send", broker="MT5", account=self.username, symbol=request["symbol"]) as timer:
+                    result = mt5.order_send(request)
+                    timer.outcome = "done" if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE else "rejected"
         except Exception as e:
-            logger.critical(f"MT5 symbol_info_tick() failed: {str(e)}")
-            self.connected = False
+            logger.critical(f"Exception occurred during order_send: {str(e)}")
+            session_manager.invalidate()
             return None
+        logger.debug(f"order_send result for account {self.username}: {result}")
+        if result is None:
+            logger.critical(f"MT5 order_send returned nothing: {mt5.last_error()}")
+            session_manager.invalidate()
+        return result
 
-        #finally:
-        #    mt5.shutdown()
-            
-    def market_order( self, symbol, dir, lotsize, price, SL, TP):
-        for attempt in range(3):
-            try:    
-                if not self.connect():
-                    return False 
-                
-                if dir == "buy":
-                    order_type = mt5.ORDER_TYPE_BUY            
-                else:
-                    order_type = mt5.ORDER_TYPE_SELL
-
-                request = {
-                    "action": mt5.TRADE_ACTION_DEAL,
-                    "symbol": symbol,
-                    "volume": lotsize,
-                    "type": order_type,
-                    "price": price,
-                    "sl": SL,
-                    "tp": TP,
-                    "deviation": int( price / 100 ),
-                    "magic": 999999,
-                    "type_time": mt5.ORDER_TIME_GTC,
-                    "type_filling": mt5.ORDER_FILLING_IOC,
-                }
-                print(request)
-                try:
-                    result = mt5.order_send(request)
-                except Exception as e:
-                    logger.critical(f"Exception occurred during order_send: {str(e)}")
-                    return False    
-                print(result)
-                if result.retcode == mt5.TRADE_RETCODE_DONE:
-                    logger.info(f"Successfully opened trade {symbol} trade size {lotsize:.2f} entry price {price:.2f}")
-                    return result
-                else:
-                    logger.critical(f"Failed to open trade {symbol}, mt5 returned error {result}")
-                    if attempt < 2:  # Only sleep if we're going to retry
-                        time.sleep(1)
-                        continue
-            except Exception as e:
-                logger.error(f"Error on attempt {attempt + 1}: {str(e)}")
-                if attempt < 2:  # Change from 3 to 2 since range(3) is 0,1,2
-                    time.sleep(1)
-                    continue
-            
-            finally:
-                mt5.shutdown()
+    def refresh_deals(self):
+        # Only deals newer than the last one seen; the upper bound leaves room
+        # for server clocks that run ahead of ours
+        deals = mt5.history_deals_get(self.deal_history.since(), datetime.now(timezone.utc) + timedelta(days=1))
+        if deals is None:
+            logger.critical(f"history_deals_get failed for account {self.username}: {mt5.last_error()}")
+            return False
+        self.deal_history.add(deals)
+        return True
 
     def get_last_pnl( self, symbol ):
         if not self.connect():
             return False
-        last_pnl = 0
-        last_time = None
-        positions = mt5.history_deals_get( datetime.now() - timedelta(days=5), datetime.now() ) 
-        if positions is None or len(positions) == 0:
-            logger.critical("get_last_pnl for {symbol} failed")
+        self.refresh_deals()
+        deal = self.deal_history.latest(symbol + self.symbol_suffix)
+        if deal is None:
+            logger.critical(f"get_last_pnl for {symbol} failed")
             return 0
-        for position in positions:
-            pos_dict = position._asdict()
-            if pos_dict['symbol'] == symbol + self.symbol_suffix:
-                if last_time is None or pos_dict['time_msc'] > last_time:
-                    last_time = pos_dict['time_msc']
-                    last_pnl = pos_dict['profit']
-
-        mt5.shutdown()
-        return last_pnl
+        return deal['profit']
         
-    def close_position( self, symbol, deal_id, side,volume):
-        for attempt in range(3):
-            try:    
-                if not self.connect():
-                    return False
-                
-                    
-                if side == "buy":
-                    # reverse order direction to close
-                    order_type = mt5.ORDER_TYPE_SELL
-                    price = self.get_price(symbol,side= "sell")
-                else:
-                    order_type = mt5.ORDER_TYPE_BUY
-                    price = self.get_price(symbol,side= "buy")
-            
-                request={
-                    "action": mt5.TRADE_ACTION_DEAL,
-                    "symbol": symbol,
-                    "volume": float("{:.2f}".format(volume)),
-                    "type": order_type,
-                    "position": deal_id,
-                    "price": float("{:.2f}".format(price)),
-                    "magic": 999999,
-                    "comment": "Close trade",
-                    "type_time": mt5.ORDER_TIME_GTC,
-                    "type_filling": mt5.ORDER_FILLING_IOC,
-                    "deviation": int( price/100 ),
-                }
-                print(request)
-                result = mt5.order_send(request)
-                print(result)
-
-                if result.retcode == mt5.TRADE_RETCODE_DONE:
-                    logger.info(f"Successfully closed trade {deal_id}")
-                    return result
-                else:
-                    logger.critical(f"retry to close trade {deal_id}")
-                    if attempt < 2:  # Only sleep if we're going to retry
-                        time.sleep(1)
-                        continue
-            except Exception as e:
-                logger.error(f"Error on attempt {attempt + 1}: {str(e)}")
-                if attempt < 2:
-                    time.sleep(1)
-                    continue
-            finally:
-                mt5.shutdown()
-            
-    
+    def send_close(self, symbol, deal_id, side, volume, price=None, max_age=None):
+        # One order_send closing a position; without a price the current quote is used
+        if not self.connect():
+            return None
+
+        if side == "buy":
+            # reverse order direction to close
+            order_type = mt5.ORDER_TYPE_SELL
+            close_side = "sell"
+        else:
+            order_type = mt5.ORDER_TYPE_BUY
+            close_side = "buy"
+        if price is None:
+            price = self.get_price(symbol, side=close_side, max_age=max_age)
+            if price is None:
+                return None
+
+        request={
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": symbol,
+            "volume": float("{:.2f}".format(volume)),
+            "type": order_type,
+            "position": deal_id,
+            "price": float("{:.2f}".format(price)),
+            "magic": ORDER_MAGIC,
+            "comment": "Close trade",
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": mt5.ORDER_FILLING_IOC,
+            "deviation": int( price/100 ),
+        }
+        result = self.send(request)
+        if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+            logger.info(f"Successfully closed trade {deal_id}")
+        return result
+
+    def find_open(self, symbol, comment):
+        """
+        Look for the open that an unanswered order_send tagged with comment.
+
+        Returns a RecoveredOrder when the position or its opening deal is on
+        the account, False when it is not, and None when the terminal could
+        not be asked.
+        """
+        if not self.connect():
+            return None
+        positions = mt5.positions_get(symbol=symbol)
+        if positions is None:
+            return None
+        for position in positions:
+            if position.magic == ORDER_MAGIC and position.comment == comment:
+                return RecoveredOrder(mt5.TRADE_RETCODE_DONE, 0, position.ticket, position.volume, position.price_open, comment)
+        # The position may already be gone again, its opening deal stays in the history
+        now = datetime.now(timezone.utc)
+        deals = mt5.history_deals_get(now - timedelta(days=1), now + timedelta(days=1))
+        if deals is None:
+            return None
+        for deal in deals:
+            if deal.entry == mt5.DEAL_ENTRY_IN and deal.magic == ORDER_MAGIC and deal.comment == comment:
+                return RecoveredOrder(mt5.TRADE_RETCODE_DONE, deal.ticket, deal.order, deal.volume, deal.price, comment)
+        return False
+
+    def send_closes(self, closes):
+        # First attempt for a batch of (symbol, deal_id, side, volume, price) in one hop to the MT5 thread
+        return [self.send_close(*close) for close in closes]
+
     def get_balance(self):
         if not self.connect():
             return
         try:
-            data = mt5.account_info()._asdict()
-            print(data)
+            with timed("account_info", broker="MT5", account=self.username):
+                data = mt5.account_info()._asdict()
+            logger.debug(f"account_info for account {self.username}: {data}")
             balance = data['balance']
-            print(balance)
             #equity = data['equity']
             return balance
         except:  
             logger.critical(f"MT5 get balance failed" )
             self.connected = False 
+            session_manager.invalidate()
     def check_positon(self):
         if not self.connect():
             return False
         positions=mt5.positions_total()
         if positions>0:
-            print(positions)
+            logger.debug(f"Account {self.username} has {positions} open positions")
             return positions
         else:
             return None 
-    
+
+    def get_positions(self):
+        # All live positions of the account in one call; None means the fetch failed
+        if not self.connect():
+            return None
+        positions = mt5.positions_get()
+        if positions is None:
+            logger.error(f"MT5 positions_get failed for account {self.username}: {mt5.last_error()}")
+            session_manager.invalidate()
+            return None
+        return [position._asdict() for position in positions]
+
+    def get_exit_prices(self, position_ids):
+        # Price of the closing deal for each position that is no longer open
+        if not self.connect():
+            return {}
+        prices = {}
+        for position_id in position_ids:
+            deals = mt5.history_deals_get(position=position_id)
+            if not deals:
+                continue
+            for deal in deals:
+                if deal.entry == mt5.DEAL_ENTRY_OUT:
+                    prices[position_id] = deal.price
+        return prices
+
+    def get_closed_positions(self, position_ids):
+        # The positions in position_ids the account no longer holds, with the
+        # price of their closing deal or None; both lookups share one login
+        positions = self.get_positions()
+        if positions is None:
+            return None
+        live = {position["identifier"] for position in positions} | {position["ticket"] for position in positions}
+        closed = [position_id for position_id in position_ids if position_id not in live]
+        prices = self.get_exit_prices(closed) if closed else {}
+        return {position_id: prices.get(position_id) for position_id in closed}
+
+class RetryingOrders:
+    """
+    Order methods for brokers backed by MT5Broker.
+
+    Every attempt is a single order_send made through call(); the retry
+    policy waits between attempts on the event loop, so backoff never holds
+    the MT5 thread or terminal. Retries pass no price, so the order goes out
+    at a quote taken right before it is sent.
+
+    An open whose order_send returned nothing may still have filled. Each
+    open carries a unique comment, and before such an open is sent again
+    the account is searched for it, so a lost reply never turns into a
+    second position.
+    """
+
+    retry_policy = order_retry_policy
+
+    async def market_order(self, symbol: str, side: str, lotsize: float, price: float, sl: float = None, tp: float = None):
+        comment = f"wh-{uuid.uuid4().hex[:16]}"
+        unanswered = False
+
+        async def send(retry):
+            nonlocal unanswered
+            if unanswered:
+                found = await self.call("find_open", symbol, comment)
+                if found is None:
+                    # Still cannot tell whether it filled, ask again after the backoff
+                    return None
+                if found:
+                    logger.warning(f"Open {symbol} for account {self.username} filled without an answer, found as order {found.order}")
+                    return found
+            result = await self.call("send_open", symbol, side, lotsize, None if retry else price, sl, tp, 0 if retry else None, comment)
+            unanswered = result is None
+            return result
+
+        return await self.retry_policy.run(send, "open", self.username, symbol)
+
+    def close_sender(self, symbol, deal_id, side, volume, price):
+        return lambda retry: self.call("send_close", symbol, deal_id, side, volume, None if retry else price, 0 if retry else None)
+
+    async def close_position(self, symbol: str, deal_id: int, side: str, volume: float, price: float = None):
+        return await self.retry_policy.run(self.close_sender(symbol, deal_id, side, volume, price), "close", self.username, symbol)
+
+    async def close_positions(self, closes):
+        # First attempts go out in one hop, only the rejected ones are sent again
+        results = await self.call("send_closes", closes)
+        return await asyncio.gather(*(
+            self.retry_policy.run(self.close_sender(*close), "close", self.username, close[0], result)
+            for close, result in zip(closes, results)
+        ))
+
+
+class AsyncMT5Broker(RetryingOrders, BrokerBase):
+    """Awaitable facade over MT5Broker that runs every call on the MT5 thread."""
+
+    def __init__(self, broker: MT5Broker):
+        self.broker = broker
+        self.username = broker.username
+        self.server = broker.server
+
+    @classmethod
+    async def create(cls, username, password, server):
+        broker = await run_in_mt5(session_manager.get_broker, username, password, server)
+        return cls(broker)
+
+    @classmethod
+    def session_lock(cls, username, server) -> asyncio.Lock:
+        return mt5_session_lock
+
+    async def call(self, method: str, *args):
+        return await run_in_mt5(getattr(self.broker, method), *args)
+
+    async def connect(self) -> bool:
+        return await run_in_mt5(self.broker.connect)
+
+    async def get_price(self, symbol: str, side: str, max_age: float = None) -> float:
+        # Fresh enough cached quotes are served without a hop to the MT5 thread
+        quote = quote_cache.get(self.server, symbol, settings.quote_max_age if max_age is None else max_age)
+        if quote is not None:
+            quote_cache.watch(self.server, symbol)
+            return quote.price(side)
+        return await run_in_mt5(self.broker.get_price, symbol, side, max_age)
+
+    async def get_balance(self) -> float:
+        return await run_in_mt5(self.broker.get_balance)
+
+    async def get_last_pnl(self, symbol: str) -> float:
+        return await run_in_mt5(self.broker.get_last_pnl, symbol)
+
+    async def get_positions(self):
+        return await run_in_mt5(self.broker.get_positions)
+
+    async def get_exit_prices(self, position_ids):
+        return await run_in_mt5(self.broker.get_exit_prices, position_ids)
+
+    async def get_closed_positions(self, position_ids):
+        return await run_in_mt5(self.broker.get_closed_positions, position_ids)
+
+
+BROKERS = {
+    "MT5": AsyncMT5Broker,
+}
+
+
+async def create_broker(broker_name, username, password, server) -> BrokerBase:
+    if broker_name not in BROKERS:
+        raise ValueError(f"Unsupported broker {broker_name}")
+    return await BROKERS[broker_name].create(username, password, server)
+
 """         
 class CTraderBroker(BrokerBase):
     def __init__(self, username: str, password: str, server: str):
@@ -240,45 +609,21 @@ class CTraderBroker(BrokerBase):
     async def get_pnl(self) -> float:
         account_info = await self.ctrader.getAccountInfo()
         return account_info['profit']"""
-    
-"""
+
 class TradingService:
     def __init__(self, broker: BrokerBase):
         self.broker = broker
 
-    async def execute_trade(self, symbol: str, order_type: str, volume: float):
-        if not await self.broker.connect():
-            raise Exception("Failed to connect to broker")
-
-        price = await self.broker.get_price(symbol)
-        order_result = await self.broker.place_order(symbol, order_type, volume, price)
-
-        balance = await self.broker.get_balance()
-        pnl = await self.broker.get_pnl()
-
-        return {
-            "order_id": order_result["order_id"],
-            "executed_price": order_result["executed_price"],
-            "current_balance": balance,
-            "current_pnl": pnl
-        }
-
-    async def close_trade(self, order_id: str):
-        if not await self.broker.connect():
-            raise Exception("Failed to connect to broker")
+    async def execute_trade(self, symbol: str, side: str, volume: float, sl: float = None, tp: float = None):
+        price = await self.broker.get_price(symbol, side)
+        if price is None:
+            raise Exception(f"Failed to get price for {symbol}")
 
-        close_result = await self.broker.close_order(order_id)
-        if not close_result:
-            raise Exception("Failed to close order")
+        return await self.broker.market_order(symbol, side, volume, price, sl, tp)
 
-        balance = await self.broker.get_balance()
-        pnl = await self.broker.get_pnl()
+    async def close_trade(self, symbol: str, deal_id: int, side: str, volume: float):
+        return await self.broker.close_position(symbol, deal_id, side, volume)
 
-        return {
-            "order_closed": True,
-            "current_balance": balance,
-            "current_pnl": pnl
-        }"""
 
 class credentials(BaseModel):
     broker: str
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import random
+import MetaTrader5 as mt5
+from config import settings
+from utils.metrics import order_retries
+
+logger = logging.getLogger(__name__)
+
+# Marks a run whose first attempt has not been sent yet
+NOT_SENT = object()
+
+
+def describe(result) -> str:
+    if result is None:
+        return "no result"
+    return f"retcode {result.retcode} ({result.comment})"
+
+
+class OrderFailure:
+    """Falsy result of a run that gave up, carrying its last answer and why it stopped."""
+
+    __slots__ = ("result", "reason")
+
+    def __init__(self, result, reason: str):
+        self.result = result
+        self.reason = reason
+
+    def __bool__(self):
+        return False
+
+    def __str__(self):
+        return f"{describe(self.result)}, {self.reason}"
+
+
+class OrderRetryPolicy:
+    """
+    Decides whether and when a rejected order_send is sent again.
+
+    Retcodes fall into three groups: the price moved (sent again at once
+    with a fresh quote), the server or connection was busy (sent again after
+    exponential backoff with full jitter) and everything else, which is
+    final. Attempts stop at max_attempts or when the next one would start
+    after deadline seconds. Subclass and override classify or backoff to
+    change the policy.
+    """
+
+    DONE = {mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_DONE_PARTIAL}
+    REQUOTE = {
+        mt5.TRADE_RETCODE_REQUOTE,
+        mt5.TRADE_RETCODE_PRICE_CHANGED,
+        mt5.TRADE_RETCODE_PRICE_OFF,
+        mt5.TRADE_RETCODE_INVALID_PRICE,
+    }
+    BUSY = {
+        mt5.TRADE_RETCODE_REJECT,
+        mt5.TRADE_RETCODE_ERROR,
+        mt5.TRADE_RETCODE_TIMEOUT,
+        mt5.TRADE_RETCODE_LOCKED,
+        mt5.TRADE_RETCODE_FROZEN,
+        mt5.TRADE_RETCODE_TOO_MANY_REQUESTS,
+        mt5.TRADE_RETCODE_CONNECTION,
+    }
+
+    def __init__(self, max_attempts: int, deadline: float, backoff_base: float, backoff_max: float):
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def classify(self, result) -> str:
+        # Nothing sent or no answer (no session, no quote, lost IPC) is treated as busy
+        if result is None:
+            return "busy"
+        if result.retcode in self.DONE:
+            return "done"
+        if result.retcode in self.REQUOTE:
+            return "requote"
+        if result.retcode in self.BUSY:
+            return "busy"
+        return "fatal"
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def run(self, send, operation: str, account, symbol: str, result=NOT_SENT):
+        """
+        Call send(retry) until an attempt succeeds and return its result, or
+        an OrderFailure describing the last attempt.
+
+        send makes one order_send; retry tells it to quote afresh instead of
+        reusing the caller's price. result is the answer to a first attempt
+        that was already sent, as in a batch of closes.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        for attempt in range(self.max_attempts):
+            if attempt:
+                order_retries.inc(operation=operation, account=account, symbol=symbol)
+            if attempt or result is NOT_SENT:
+                result = await send(attempt > 0)
+
+            outcome = self.classify(result)
+            if outcome == "done":
+                return result
+            if outcome == "fatal":
+                failure = OrderFailure(result, "not retrying")
+                logger.critical(f"{operation} {symbol} for account {account} failed with {failure}")
+                return failure
+            if attempt + 1 == self.max_attempts:
+                break
+
+            delay = 0.0 if outcome == "requote" else self.backoff(attempt)
+            if loop.time() + delay > deadline:
+                failure = OrderFailure(result, "deadline reached")
+                logger.critical(f"{operation} {symbol} for account {account} failed with {failure}")
+                return failure
+            logger.warning(f"{operation} {symbol} for account {account} got {describe(result)}, retrying in {delay * 1000:.0f}ms")
+            if delay:
+                await asyncio.sleep(delay)
+
+        failure = OrderFailure(result, f"gave up after {self.max_attempts} attempts")
+        logger.critical(f"{operation} {symbol} for account {account} failed with {failure}")
+        return failure
+
+
+order_retry_policy = OrderRetryPolicy(
+    settings.order_max_attempts,
+    settings.order_deadline,
+    settings.order_backoff_base,
+    settings.order_backoff_max,
+)
@@ -0,0 +1,309 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import zlib
+from collections import namedtuple
+from config import settings
+from models.brokers import BROKERS, BrokerBase, RetryingOrders
+from utils.metrics import Counter, registry
+from utils.tick_cache import quote_cache
+
+logger = logging.getLogger(__name__)
+
+terminal_restarts = registry.register(Counter(
+    "mt5_terminal_restarts_total",
+    "Terminal worker processes restarted after they died",
+    ("terminal",),
+))
+
+
+class TerminalError(Exception):
+    pass
+
+
+def portable(value):
+    # MT5 result types do not survive pickling, send them as plain records
+    if hasattr(value, "_asdict"):
+        return ("__record__", type(value).__name__, {key: portable(item) for key, item in value._asdict().items()})
+    if isinstance(value, (list, tuple)):
+        return [portable(item) for item in value]
+    if isinstance(value, dict):
+        return {key: portable(item) for key, item in value.items()}
+    return value
+
+
+record_types = {}
+
+
+def restore(value):
+    if isinstance(value, tuple) and len(value) == 3 and value[0] == "__record__":
+        _, name, fields = value
+        record_type = record_types.get((name, tuple(fields)))
+        if record_type is None:
+            record_type = record_types[(name, tuple(fields))] = namedtuple(name, fields)
+        return record_type(**{key: restore(item) for key, item in fields.items()})
+    if isinstance(value, list):
+        return [restore(item) for item in value]
+    if isinstance(value, dict):
+        return {key: restore(item) for key, item in value.items()}
+    return value
+
+
+def terminal_worker(path, conn):
+    """Entry point of a terminal process: run calls for its accounts one at a time."""
+    from models.brokers import session_manager
+    from utils.metrics import registry
+    session_manager.terminal_path = path
+
+    # Drain the pipe as soon as requests arrive so the parent never blocks on send
+    inbox = queue.Queue()
+
+    def receive():
+        while True:
+            try:
+                inbox.put(conn.recv())
+            except (EOFError, OSError):
+                inbox.put(None)
+                return
+
+    threading.Thread(target=receive, daemon=True).start()
+    while True:
+        message = inbox.get()
+        if message is None:
+            break
+        call_id, account, method, args = message
+        try:
+            if account is None:
+                result = getattr(session_manager, method)(*args)
+            else:
+                result = getattr(session_manager.get_broker(*account), method)(*args)
+            reply = (call_id, portable(result), None)
+        except Exception as e:
+            reply = (call_id, None, f"{type(e).__name__}: {e}")
+        # Timings and counters recorded here only reach /metrics through the parent
+        reply += (registry.drain(),)
+        try:
+            conn.send(reply)
+        except (EOFError, OSError):
+            break
+    session_manager.shutdown()
+
+
+class Terminal:
+    def __init__(self, index: int, path: str):
+        self.index = index
+        self.path = path
+        self.process = None
+        self.conn = None
+        self.pending = {}
+        # Held by an order pipeline so its account stays logged in for all of its calls
+        self.session = asyncio.Lock()
+
+
+class TerminalPool:
+    """
+    Runs each MT5 terminal installation in its own worker process.
+
+    The MetaTrader5 package drives one terminal per process, so a single
+    process can only have one account logged in at a time. The pool starts
+    one child process per terminal path and assigns every account to a fixed
+    terminal by hashing its server and login, so an account always stays
+    logged in on the same terminal. Calls go to the child over a pipe and
+    terminals work in parallel. A worker that dies is restarted and its
+    in-flight calls fail. Metrics recorded in a worker come back with each
+    reply and are merged into this process's registry.
+    """
+
+    def __init__(self, paths, call_timeout: float):
+        self.terminals = [Terminal(index, path) for index, path in enumerate(paths)]
+        self.call_timeout = call_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.ids = itertools.count()
+        self.loop = None
+        self.task = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.terminals)
+
+    def terminal_for(self, username, server) -> Terminal:
+        key = f"{server}:{username}".encode()
+        return self.terminals[zlib.crc32(key) % len(self.terminals)]
+
+    def spawn(self, terminal: Terminal):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=terminal_worker, args=(terminal.path, child_conn),
+            name=f"mt5-terminal-{terminal.index}", daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        terminal.process, terminal.conn = process, parent_conn
+        threading.Thread(target=self.read_replies, args=(terminal, parent_conn), daemon=True).start()
+        logger.info(f"Started MT5 terminal worker {terminal.index} (pid {process.pid}) for {terminal.path}")
+
+    def read_replies(self, terminal: Terminal, conn):
+        while True:
+            try:
+                call_id, result, error, metrics = conn.recv()
+            except (EOFError, OSError):
+                return
+            registry.merge(metrics)
+            self.loop.call_soon_threadsafe(self.resolve, terminal, call_id, result, error)
+
+    def resolve(self, terminal: Terminal, call_id, result, error):
+        future = terminal.pending.pop(call_id, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(TerminalError(error))
+        else:
+            future.set_result(restore(result))
+
+    def fail_pending(self, terminal: Terminal, reason: str):
+        pending, terminal.pending = terminal.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(TerminalError(reason))
+
+    async def call_terminal(self, terminal: Terminal, account, method: str, *args):
+        call_id = next(self.ids)
+        future = self.loop.create_future()
+        terminal.pending[call_id] = future
+        try:
+            terminal.conn.send((call_id, account, method, args))
+        except (OSError, ValueError) as e:
+            terminal.pending.pop(call_id, None)
+            raise TerminalError(f"MT5 terminal worker {terminal.index} is unavailable: {str(e)}")
+        try:
+            return await asyncio.wait_for(future, self.call_timeout)
+        except asyncio.TimeoutError:
+            raise TerminalError(f"MT5 terminal worker {terminal.index} did not answer {method} within {self.call_timeout}s")
+        finally:
+            terminal.pending.pop(call_id, None)
+
+    async def call(self, username, password, server, method: str, *args):
+        terminal = self.terminal_for(username, server)
+        return await self.call_terminal(terminal, (username, password, server), method, *args)
+
+    def busy(self) -> bool:
+        return all(terminal.pending for terminal in self.terminals)
+
+    async def refresh_quotes(self, keys):
+        # Every idle terminal refreshes the symbols of the server it is logged
+        # in to; terminals with calls in flight are left to their orders
+        results = await asyncio.gather(
+            *(self.call_terminal(terminal, None, "refresh_quotes", keys) for terminal in self.terminals if not terminal.pending),
+            return_exceptions=True,
+        )
+        for refreshed in results:
+            if isinstance(refreshed, Exception):
+                continue
+            for server, symbol, bid, ask in refreshed:
+                quote_cache.put(server, symbol, bid, ask)
+
+    async def monitor(self):
+        while True:
+            await asyncio.sleep(1)
+            for terminal in self.terminals:
+                if terminal.process.is_alive():
+                    continue
+                logger.error(f"MT5 terminal worker {terminal.index} exited with code {terminal.process.exitcode}, restarting")
+                self.fail_pending(terminal, f"MT5 terminal worker {terminal.index} crashed")
+                terminal.conn.close()
+                terminal_restarts.inc(terminal=str(terminal.index))
+                try:
+                    self.spawn(terminal)
+                except Exception as e:
+                    logger.error(f"Failed to restart MT5 terminal worker {terminal.index}: {str(e)}")
+
+    def start(self):
+        if not self.enabled or self.task is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        for terminal in self.terminals:
+            self.spawn(terminal)
+        self.task = asyncio.create_task(self.monitor())
+
+    async def stop(self, timeout: float = 10):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        for terminal in self.terminals:
+            try:
+                terminal.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for terminal in self.terminals:
+            # Let the worker log out of its terminal before it is killed
+            await asyncio.get_running_loop().run_in_executor(None, terminal.process.join, timeout)
+            if terminal.process.is_alive():
+                terminal.process.terminate()
+            self.fail_pending(terminal, "MT5 terminal pool is shutting down")
+            terminal.conn.close()
+
+
+class RemoteMT5Broker(RetryingOrders, BrokerBase):
+    """MT5 broker whose calls run in the terminal worker that owns the account."""
+
+    def __init__(self, username, password, server):
+        self.username = username
+        self.password = password
+        self.server = server
+
+    @classmethod
+    async def create(cls, username, password, server):
+        return cls(username, password, server)
+
+    @classmethod
+    def session_lock(cls, username, server) -> asyncio.Lock:
+        return terminal_pool.terminal_for(username, server).session
+
+    async def call(self, method: str, *args):
+        return await terminal_pool.call(self.username, self.password, self.server, method, *args)
+
+    async def connect(self) -> bool:
+        return await self.call("connect")
+
+    async def get_price(self, symbol: str, side: str, max_age: float = None) -> float:
+        # Quotes are shared by every account on the server, whichever terminal fetched them
+        quote = quote_cache.get(self.server, symbol, settings.quote_max_age if max_age is None else max_age)
+        if quote is None:
+            fetched = await self.call("get_quote", symbol, max_age)
+            if fetched is None:
+                return None
+            quote = quote_cache.put(self.server, symbol, fetched.bid, fetched.ask)
+        quote_cache.watch(self.server, symbol)
+        return quote.price(side)
+
+    async def get_balance(self) -> float:
+        return await self.call("get_balance")
+
+    async def get_last_pnl(self, symbol: str) -> float:
+        return await self.call("get_last_pnl", symbol)
+
+    async def get_positions(self):
+        return await self.call("get_positions")
+
+    async def get_exit_prices(self, position_ids):
+        return await self.call("get_exit_prices", position_ids)
+
+    async def get_closed_positions(self, position_ids):
+        return await self.call("get_closed_positions", position_ids)
+
+
+terminal_pool = TerminalPool(
+    [path.strip() for path in settings.mt5_terminal_paths.split(";") if path.strip()],
+    settings.terminal_call_timeout,
+)
+
+if terminal_pool.enabled:
+    BROKERS["MT5"] = RemoteMT5Broker
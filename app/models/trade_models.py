@@ -12,6 +12,7 @@ class TradeRequest(BaseModel):
     price: int
     stoploss: Optional[float] = None
     takeprofit: Optional[float] = None
+    signal_id: Optional[str] = None
 
 class Trades(BaseModel): 
     order_id: int
@@ -32,6 +33,13 @@ class CloseRequest(BaseModel):
     strategy_name: str 
     symbol: str
     side: str
+    signal_id: Optional[str] = None
+
+class FlattenRequest(BaseModel):
+    broker: List[str]
+    strategy_name: Optional[str] = None
+    symbol: Optional[str] = None
+    signal_id: Optional[str] = None
 
 class ticker(BaseModel):
     ticker: str
@@ -39,4 +47,5 @@ class ticker(BaseModel):
     margin: float
     contract: int
     leverage: int
+    comission: float = 0.0
 
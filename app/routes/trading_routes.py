@@ -1,18 +1,35 @@
 # auth_routes.py
-from fastapi import Security,APIRouter, HTTPException, Depends
+from fastapi import Security,APIRouter, HTTPException, Depends, Header
+from fastapi.responses import StreamingResponse
 from fastapi.security import APIKeyHeader
-from utils.mongo import get_ticker,get_open_positions_from_account,get_accounts_for_broker, get_open_positions, update_trade_with_exit, get_open_position_info
+from bson import ObjectId
+from bson.errors import InvalidId
+import contextlib
+import csv
+import io
+import json
+import math
 from datetime import datetime
 import logging
 from config import settings
-from models.trade_models import TradeRequest, Trades, CloseRequest, ticker
-from utils.calculation import calculate_position_size,calculate_price_level, get_latest_open_position, update_trade_with_exit
+from models.trade_models import TradeRequest, Trades, CloseRequest, FlattenRequest, ticker
+from utils.calculation import calculate_position_size, calculate_price_level, get_latest_open_position
 import time
 from dotenv import load_dotenv
+from utils.ticker_cache import ticker_cache
+from utils.account_registry import account_registry
+from utils.write_behind import trade_writer
+from utils.position_book import position_book
+from utils.reconciler import reconciler
+from utils.rollups import backfill_rollups, get_rollups
+from utils.idempotency import idempotency, idempotency_key
+from utils.jobs import job_queue
+from utils.metrics import timed
+from utils.rate_limit import rate_limiter
+from utils.mongo import db, stream_trades
 from utils.telegram_bot import send_telegram_close_signal, send_telegram_trade_signal
 from config import settings
-from models.brokers import MT5Broker, credentials, DeleteAccountRequest
-from motor.motor_asyncio import AsyncIOMotorClient
+from models.brokers import BROKERS, create_broker, TradingService, credentials, DeleteAccountRequest
 import asyncio
 load_dotenv()
 
@@ -20,10 +37,6 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 bot_token = settings.tg_token
 channel_id = settings.chan_id
-mongo_uri = settings.mongo_uri
-db_name = settings.mongo_db_name
-client = AsyncIOMotorClient(mongo_uri)
-db = client[db_name]
 api_key_header = APIKeyHeader(name="X-API-Key")
 admin_key_header = APIKeyHeader(name="X-Admin-Key")
 
@@ -35,201 +48,515 @@ async def verify_api_key(api_key: str | None = None):
         raise HTTPException(status_code=403, detail="Invalid API key")
     return api_key
 
+async def enforce_rate_limit(api_key: str, strategy: str):
+    retry_after = await rate_limiter.check(api_key=api_key, strategy=strategy)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded", headers={"Retry-After": str(math.ceil(retry_after))})
+
 async def verify_admin_key(api_key: str = Security(admin_key_header)):
     if api_key != settings.admin_api_key:
         raise HTTPException(status_code=403, detail="Invalid admin key")
     return api_key
 async def get_broker(broker_name, username, password, server):
-    if broker_name == 'MT5':
-        broker = MT5Broker(username,password,server)
-    return broker    
+    if broker_name not in BROKERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported broker {broker_name}")
+    return await create_broker(broker_name, username, password, server)
+
+def record_trade_open(trade: dict):
+    position_book.open(trade)
+    trade_writer.insert_trade(trade)
+
+def record_trade_exit(order_id, exit_price):
+    trade = position_book.close(order_id)
+    trade_writer.update_trade_exit(order_id, exit_price, trade)
+
+async def prepare_account(brokername, account, tradereq: TradeRequest):
+    """
+    Resolve the broker, settle any conflicting position and read the balance.
+
+    Returns a "ready" entry carrying the broker and balance when the account
+    should trade, otherwise the account's final result.
+    """
+    username = account['username']
+    password = account['password']
+    server = account['server']
+
+    if await rate_limiter.check(account=f"{brokername}:{username}"):
+        return {"broker": brokername, "username": username, "status": "rate_limited", "detail": "Account order rate limit exceeded"}
+
+    with timed("broker_session", broker=brokername, account=username):
+        broker = await get_broker(brokername, username, password, server)
+    service = TradingService(broker)
+    current_position = await position_book.find_position(username, tradereq.symbol)
+
+    if current_position:
+        current_side = current_position["side"]
+        current_strategy = current_position["strategy_name"]
+
+        if current_side == tradereq.action:
+            # Same side, proceed to place the order
+            logger.info(f"Existing {current_side} position matches new signal. Proceeding to place additional order.")
+        elif current_strategy == tradereq.strat:
+            # Opposite side, same strategy, close current position
+            try:
+                with timed("close_opposite", broker=brokername, account=username, symbol=tradereq.symbol):
+                    result = await service.close_trade(
+                        tradereq.symbol,
+                        current_position["order_id"],
+                        current_side,
+                        current_position["volume"]
+                    )
+                logger.info(f"Closed existing {current_side} trade for strategy {current_strategy} before opening new {tradereq.action} trade")
+                if result:
+                    record_trade_exit(current_position["order_id"], result.price)
+                    await send_telegram_close_signal(
+                        settings.tg_token,
+                        settings.chan_id,
+                        current_strategy,
+                        tradereq.symbol,
+                        current_side,
+                        result.price
+                    )
+            except Exception as e:
+                logger.error(f"Failed to close existing trade: {e}")
+                return {"broker": brokername, "username": username, "status": "error", "detail": f"Failed to close existing trade: {e}"}
+        else:
+            # Opposite side, different strategy, ignore the signal
+            logger.info(f"Ignoring signal: Existing {current_side} trade for different strategy {current_strategy}.")
+            return {"broker": brokername, "username": username, "status": "skipped", "detail": f"Existing {current_side} trade for strategy {current_strategy}"}
+
+    # At this point, either there was no existing position, or it was closed, or it's on the same side
+    with timed("get_balance", broker=brokername, account=username) as timer:
+        account_balance = await broker.get_balance()
+        if account_balance is None:
+            timer.outcome = "failed"
+    if account_balance is None:
+        return {"broker": brokername, "username": username, "status": "error", "detail": "Failed to read account balance"}
+
+    return {"broker": brokername, "username": username, "status": "ready", "client": broker, "balance": account_balance}
+
+
+async def submit_order(ready: dict, tradereq: TradeRequest, volume: float, stoploss, takeprofit):
+    """Send the sized order for a prepared account and record the fill."""
+    brokername = ready["broker"]
+    username = ready["username"]
+
+    # Execute the trade at the current price
+    with timed("execute_trade", broker=brokername, account=username, symbol=tradereq.symbol) as timer:
+        result = await TradingService(ready["client"]).execute_trade(
+            tradereq.symbol,
+            tradereq.action,
+            volume,
+            stoploss,
+            takeprofit
+        )
+        if not result:
+            timer.outcome = "rejected"
+    if not result:
+        return {"broker": brokername, "username": username, "status": "error", "detail": "Order was rejected by the broker"}
+
+    trade = Trades(
+        order_id=result.order,
+        username=username,
+        broker=brokername,
+        strategy_name=tradereq.strat,
+        symbol=tradereq.symbol,
+        volume=volume,
+        side=tradereq.action,
+        entry=result.price,
+        exit=None
+    )
+
+    # Book the position and queue the validated data for the next batched write to MongoDB
+    with timed("record_trade", broker=brokername, account=username, symbol=tradereq.symbol):
+        record_trade_open(trade.model_dump())
+
+    with timed("notify", broker=brokername, account=username, symbol=tradereq.symbol):
+        await send_telegram_trade_signal(
+            settings.tg_token, settings.chan_id, tradereq.strat, tradereq.symbol,
+            tradereq.action, result.price, order_id=result.deal
+        )
+
+    return {
+        "broker": brokername,
+        "username": username,
+        "status": "filled",
+        "order_details": result,
+        "calculated_volume": volume,
+    }
+
+
+def session_lock(brokername, account):
+    if brokername not in BROKERS:
+        return contextlib.nullcontext()
+    return BROKERS[brokername].session_lock(account["username"], account["server"])
+
+async def execute_order_for_account(brokername, account, tradereq: TradeRequest, stoploss, takeprofit):
+    """
+    Run the full order pipeline for one account and return a per-account result.
+
+    The pipeline holds the terminal's session lock, so the balance read and
+    the order go out under a single login of the account.
+    """
+    async with session_lock(brokername, account):
+        ready = await prepare_account(brokername, account, tradereq)
+        if ready["status"] != "ready":
+            return ready
+
+        ticker = await ticker_cache.get(tradereq.symbol)
+        if ticker is None:
+            return {"broker": brokername, "username": ready["username"], "status": "error", "detail": f"No ticker spec found for {tradereq.symbol}"}
+        volume = calculate_position_size(ready["balance"], tradereq.volume, ticker["contract"], ticker["margin"], ticker["leverage"], ticker.get("comission", 0.0), tradereq.price, 0.01)
+
+        return await submit_order(ready, tradereq, volume, stoploss, takeprofit)
+
+
+async def fan_out_order(tradereq: TradeRequest, stoploss, takeprofit):
+    """
+    Run the order pipeline for every account of every broker concurrently.
+
+    Each account runs its whole pipeline on its own rather than waiting for
+    every balance before any order is sent. Accounts on one terminal then
+    take turns, each logged in once per signal, while separate terminals
+    work in parallel.
+    """
+    semaphore = asyncio.Semaphore(settings.max_concurrent_orders)
+
+    async def run(brokername, username, step, *args):
+        async with semaphore:
+            try:
+                return await step(*args)
+            except Exception as e:
+                logger.exception(f"Error placing order for account {username}: {e}")
+                return {"broker": brokername, "username": username, "status": "error", "detail": str(e)}
+
+    ticker = await ticker_cache.get(tradereq.symbol)
+    if ticker is None:
+        return [{"broker": brokername, "username": None, "status": "error", "detail": f"No ticker spec found for {tradereq.symbol}"} for brokername in tradereq.broker]
+
+    account_lists = await asyncio.gather(*(account_registry.get_accounts(brokername) for brokername in tradereq.broker))
+
+    results = []
+    jobs = []
+    for brokername, accounts in zip(tradereq.broker, account_lists):
+        if not accounts:
+            results.append({"broker": brokername, "username": None, "status": "error", "detail": f"No accounts found for broker {brokername}"})
+            continue
+        jobs.extend(
+            run(brokername, account.get('username'), execute_order_for_account, brokername, account, tradereq, stoploss, takeprofit)
+            for account in accounts
+        )
+
+    results.extend(await asyncio.gather(*jobs))
+    return results
+
 
 @router.post("/place_order/{api_key}")
-async def place_order(tradereq: TradeRequest, api_key: str):
+async def place_order(tradereq: TradeRequest, api_key: str, fanout: bool = False, idempotency_key_header: str | None = Header(None, alias="Idempotency-Key")):
     await verify_api_key(api_key)
+    key = idempotency_key("place_order", tradereq, idempotency_key_header)
+    with timed("place_order", symbol=tradereq.symbol):
+        return await idempotency.run(
+            key, lambda: execute_place_order(tradereq, fanout), admit=lambda: enforce_rate_limit(api_key, tradereq.strat)
+        )
+
+
+async def execute_place_order(tradereq: TradeRequest, fanout: bool = False):
+    # SL/TP only depend on the signal, so compute them once for all accounts
+    stoploss = await calculate_price_level(tradereq.price, tradereq.stoploss, tradereq.action, 'sl') if tradereq.stoploss else None
+    takeprofit = await calculate_price_level(tradereq.price, tradereq.takeprofit, tradereq.action, 'tp') if tradereq.takeprofit else None
+
+    if fanout:
+        results = await fan_out_order(tradereq, stoploss, takeprofit)
+        return {
+            "message": "Order fan-out completed",
+            "filled": sum(1 for r in results if r["status"] == "filled"),
+            "adjusted_stoploss": stoploss,
+            "adjusted_takeprofit": takeprofit,
+            "results": results,
+        }
+
     for brokername in tradereq.broker:
-        accounts = await get_accounts_for_broker(brokername)
-        
+        accounts = await account_registry.get_accounts(brokername)
+
         if not accounts:
             raise HTTPException(status_code=404, detail=f"No accounts found for broker {tradereq.broker}")
-        
+
         for account in accounts:
-            username = account['username']
-            password = account['password']
-            server = account['server']
-
-            broker = await get_broker(brokername, username, password, server)
-            current_position = await get_open_position_info(tradereq.symbol, username)
-
-            if current_position:
-                current_side = current_position["side"]
-                current_strategy = current_position["strategy_name"]
-                
-                if current_side == tradereq.action:
-                    # Same side, proceed to place the order
-                    logger.info(f"Existing {current_side} position matches new signal. Proceeding to place additional order.")
-                elif current_strategy == tradereq.strat:
-                    # Opposite side, same strategy, close current position
-                    try:
-                        result = broker.close_position(
-                            tradereq.symbol,
-                            current_position["order_id"],
-                            current_side,
-                            current_position["volume"]
-                        )
-                        logger.info(f"Closed existing {current_side} trade for strategy {current_strategy} before opening new {tradereq.action} trade")
-                        if result:
-                            await update_trade_with_exit(current_position["order_id"], result.price)
-                            await send_telegram_close_signal(
-                                settings.tg_token,
-                                settings.chan_id,
-                                current_strategy,
-                                tradereq.symbol,
-                                current_side,
-                                result.price
-                            )
-                    except Exception as e:
-                        logger.error(f"Failed to close existing trade: {e}")
-                        continue  # Skip to next account if closing fails
-                else:
-                    # Opposite side, different strategy, ignore the signal
-                    logger.info(f"Ignoring signal: Existing {current_side} trade for different strategy {current_strategy}.")
-                    continue  # Skip to next account
-
-            # At this point, either there was no existing position, or it was closed, or it's on the same side
             try:
-                # Get account balance and calculate order size
-                account_balance = broker.get_balance()
-                
-                ticker =await get_ticker(tradereq.symbol)
-                volume = await calculate_position_size(account_balance,tradereq.volume,ticker["contract"],ticker["margin"],ticker["leverage"],ticker["comission"],tradereq.price,0.01)
-
-                if tradereq.stoploss:
-                    tradereq.stoploss = await calculate_price_level(tradereq.price, tradereq.stoploss, tradereq.action, 'sl')
-                else:
-                    tradereq.stoploss = None
-
-                if tradereq.takeprofit:
-                    tradereq.takeprofit = await calculate_price_level(tradereq.price, tradereq.takeprofit, tradereq.action, 'tp')
-                else:
-                    tradereq.takeprofit = None
-
-                # Get current price 
-                current_price = broker.get_price(tradereq.symbol, tradereq.action)
-
-                # Execute the trade
-                result = broker.market_order(
-                    tradereq.symbol,
-                    tradereq.action,
-                    volume,
-                    current_price,
-                    tradereq.stoploss,
-                    tradereq.takeprofit
-                )
-
-                trade = Trades(
-                    order_id=result.order,
-                    username=username,
-                    broker=brokername,
-                    strategy_name=tradereq.strat,
-                    symbol=tradereq.symbol,
-                    volume=volume,
-                    side=tradereq.action,
-                    entry=result.price,
-                    exit=None
-                )
-
-                # Insert the validated data into MongoDB
-                await db.trades.insert_one(trade.model_dump())
-
-                await send_telegram_trade_signal(
-                    settings.tg_token, settings.chan_id, tradereq.strat, tradereq.symbol,
-                    tradereq.action, result.price, order_id=result.deal
-                )
-
-                return {
-                    "message": "Order placed successfully",
-                    "order_details": result,
-                    "calculated_volume": volume,
-                    "adjusted_stoploss": tradereq.stoploss,
-                    "adjusted_takeprofit": tradereq.takeprofit,
-                    
-                }
-
+                result = await execute_order_for_account(brokername, account, tradereq, stoploss, takeprofit)
             except Exception as e:
                 logger.exception(f"Error placing order: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
 
+            if result["status"] != "filled":
+                continue  # Skip to next account
+
+            return {
+                "message": "Order placed successfully",
+                "order_details": result["order_details"],
+                "calculated_volume": result["calculated_volume"],
+                "adjusted_stoploss": stoploss,
+                "adjusted_takeprofit": takeprofit,
+            }
+
     raise HTTPException(status_code=400, detail="No valid accounts found to place the order")
 
 @router.post("/close_position/{api_key}")
-async def close_position(closereq: CloseRequest,api_key: str):
+async def close_position(closereq: CloseRequest,api_key: str, idempotency_key_header: str | None = Header(None, alias="Idempotency-Key")):
     await verify_api_key(api_key)
-    try:
-        for broker_name in closereq.broker:
-            accounts = await get_accounts_for_broker(broker_name)
-            
-            if not accounts:
-                logger.warning(f"No accounts found for broker: {broker_name}")
-                continue
-
-            for account in accounts:
-                username = account['username']
-                password = account['password']
-                server = account['server']
-                
-                try:
-                    broker = await get_broker(broker_name, username, password, server)
-                    
-                    # Query the positions in the db by the strategy and the symbol
-                    positions = await get_open_positions(username, closereq.strategy_name, closereq.symbol)
-                    
-                    if positions:
-
-                        for position in positions:
-                            position_id = int(position['order_id'])
-                            volume = position['volume'] 
-                            
-                            try:
-                                
-                                close_response = broker.close_position(closereq.symbol, position_id, closereq.side, volume)
-                                closed_price = close_response.price
-
-                                await update_trade_with_exit(position_id, closed_price)
-                                await send_telegram_close_signal(
-                                    settings.tg_token,
-                                    settings.chan_id,
-                                    closereq.strategy_name,
-                                    closereq.symbol,
-                                    position.side,  # Use the side from the position, not from closereq
-                                    closed_price
-                                )
-                                
-                                logger.info(f"Successfully closed position: {position_id} at price: {closed_price}")
-                            except Exception as e:
-                                logger.error(f"Error closing position after 3 attempts {position_id}: {str(e)}")
-                                # Continue to next position even if one fails
-                                continue
-                    else:
-                        logger.info(f"No open positions found for strategy: {closereq.strategy_name}, symbol: {closereq.symbol}")
-                        continue           
-                except Exception as e:
-                    logger.error(f"Error with broker {broker_name} for account {username}: {str(e)}")
-                        # Continue to next account even if one fails
-                    continue
-
-            return {"message": "Close position operation completed"}
+    key = idempotency_key("close_position", closereq, idempotency_key_header)
+    with timed("close_position", symbol=closereq.symbol):
+        return await idempotency.run(key, lambda: execute_close_position(closereq))
+
+
+def close_side(side):
+    return "sell" if side == "buy" else "buy"
+
+
+async def quote_positions(targets):
+    """
+    Fetch one closing quote per server, symbol and side.
+
+    targets is a list of (broker, positions). Every position closed at the
+    same price shares the quote, so flattening many accounts costs one
+    price fetch per symbol instead of one per position.
+    """
+    keys = {}
+    for broker, positions in targets:
+        for position in positions:
+            keys.setdefault((broker.server, position["symbol"], close_side(position["side"])), broker)
+    prices = await asyncio.gather(*(broker.get_price(symbol, side) for (_, symbol, side), broker in keys.items()), return_exceptions=True)
+    # A missing quote only means that position fetches its own when it is closed
+    return {key: None if isinstance(price, Exception) else price for key, price in zip(keys, prices)}
+
+
+async def close_account_positions(broker_name, broker, username, positions, prices):
+    """Close the given positions of one account in a single batch and report each of them."""
+    closes = [
+        (position["symbol"], int(position["order_id"]), position["side"], position["volume"],
+         prices.get((broker.server, position["symbol"], close_side(position["side"]))))
+        for position in positions
+    ]
+    with timed("close_order", broker=broker_name, account=username):
+        results = await broker.close_positions(closes)
+
+    reports = []
+    for position, result in zip(positions, results):
+        position_id = int(position["order_id"])
+        report = {"broker": broker_name, "username": username, "order_id": position_id, "symbol": position["symbol"]}
+        if not result:
+            # The retry policy's failure carries the last retcode and why it stopped
+            logger.error(f"Error closing position {position_id}: {result}")
+            reports.append({**report, "status": "error", "detail": f"Close was rejected by the broker: {result}"})
+            continue
+
+        with timed("record_trade", broker=broker_name, account=username, symbol=position["symbol"]):
+            record_trade_exit(position_id, result.price)
+        with timed("notify", broker=broker_name, account=username, symbol=position["symbol"]):
+            await send_telegram_close_signal(
+                settings.tg_token,
+                settings.chan_id,
+                position["strategy_name"],
+                position["symbol"],
+                position["side"],
+                result.price
+            )
+        logger.info(f"Successfully closed position: {position_id} at price: {result.price}")
+        reports.append({**report, "status": "closed", "price": result.price})
+    return reports
+
+
+async def close_positions_for_account(broker_name, account, closereq: CloseRequest):
+    """Close the strategy's open positions on one account and report each of them."""
+    username = account['username']
+
+    # Query the open positions by the strategy and the symbol
+    positions = await position_book.find_positions(username, closereq.strategy_name, closereq.symbol)
+
+    if not positions:
+        logger.info(f"No open positions found for strategy: {closereq.strategy_name}, symbol: {closereq.symbol}")
+        return {"broker": broker_name, "username": username, "status": "no_positions", "positions": []}
+
+    with timed("broker_session", broker=broker_name, account=username):
+        broker = await get_broker(broker_name, username, account['password'], account['server'])
+    prices = await quote_positions([(broker, positions)])
+    reports = await close_account_positions(broker_name, broker, username, positions, prices)
+
+    status = "closed" if all(report["status"] == "closed" for report in reports) else "error"
+    return {"broker": broker_name, "username": username, "status": status, "positions": reports}
+
+
+async def flatten(broker_names, strategy_name=None, symbol=None):
+    """
+    Close every open position of a strategy and/or symbol across all accounts.
+
+    Positions come from the position book, topped up with one query for
+    trades other workers opened since its last reload, so only accounts that
+    hold something get a broker session. Quotes are fetched once per symbol and
+    each account's positions are closed in one batch, with the accounts
+    running concurrently.
+    """
+    account_lists = await asyncio.gather(*(account_registry.get_accounts(broker_name) for broker_name in broker_names))
+    query = {"broker": {"$in": list(broker_names)}}
+    if strategy_name is not None:
+        query["strategy_name"] = strategy_name
+    if symbol is not None:
+        query["symbol"] = symbol
+    await position_book.fetch(query)
+
+    targets = []
+    for broker_name, accounts in zip(broker_names, account_lists):
+        if not accounts:
+            logger.warning(f"No accounts found for broker: {broker_name}")
+        for account in accounts:
+            positions = [
+                position for position in position_book.get_account_positions(account['username'], broker_name)
+                if (strategy_name is None or position["strategy_name"] == strategy_name)
+                and (symbol is None or position["symbol"] == symbol)
+            ]
+            if positions:
+                targets.append((broker_name, account, positions))
+
+    semaphore = asyncio.Semaphore(settings.max_concurrent_orders)
+
+    def failed(broker_name, username, positions, detail):
+        return [
+            {"broker": broker_name, "username": username, "order_id": int(position["order_id"]),
+             "symbol": position["symbol"], "status": "error", "detail": detail}
+            for position in positions
+        ]
 
+    async def connect(broker_name, account):
+        async with semaphore:
+            with timed("broker_session", broker=broker_name, account=account['username']):
+                return await get_broker(broker_name, account['username'], account['password'], account['server'])
+
+    brokers = await asyncio.gather(*(connect(broker_name, account) for broker_name, account, _ in targets), return_exceptions=True)
+    prices = await quote_positions([
+        (broker, positions) for broker, (_, _, positions) in zip(brokers, targets) if not isinstance(broker, Exception)
+    ])
+
+    async def close(broker, broker_name, account, positions):
+        username = account['username']
+        if isinstance(broker, Exception):
+            logger.error(f"Error with broker {broker_name} for account {username}: {str(broker)}")
+            return failed(broker_name, username, positions, str(broker))
+        async with semaphore:
+            try:
+                return await close_account_positions(broker_name, broker, username, positions, prices)
+            except Exception as e:
+                logger.error(f"Error with broker {broker_name} for account {username}: {str(e)}")
+                return failed(broker_name, username, positions, str(e))
+
+    account_reports = await asyncio.gather(*(
+        close(broker, *target) for broker, target in zip(brokers, targets)
+    ))
+    reports = [report for account_report in account_reports for report in account_report]
+    return {
+        "closed": sum(1 for report in reports if report["status"] == "closed"),
+        "failed": sum(1 for report in reports if report["status"] != "closed"),
+        "positions": reports,
+    }
+
+
+async def execute_close_position(closereq: CloseRequest):
+    try:
+        result = await flatten(closereq.broker, closereq.strategy_name, closereq.symbol)
     except Exception as e:
         logger.exception(f"Error in close_position: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    
-    
+    return {"message": "Close position operation completed", **result}
+
+
+@router.post("/flatten/{api_key}")
+async def flatten_positions(flattenreq: FlattenRequest, api_key: str, idempotency_key_header: str | None = Header(None, alias="Idempotency-Key")):
+    await verify_api_key(api_key)
+    if flattenreq.strategy_name is None and flattenreq.symbol is None:
+        raise HTTPException(status_code=400, detail="Give a strategy_name, a symbol or both")
+    key = idempotency_key("flatten", flattenreq, idempotency_key_header)
+    with timed("flatten", symbol=flattenreq.symbol or ""):
+        result = await idempotency.run(key, lambda: flatten(flattenreq.broker, flattenreq.strategy_name, flattenreq.symbol))
+    return {"message": "Flatten completed", **result}
+
+
+async def find_account(broker_name, username):
+    for account in await account_registry.get_accounts(broker_name):
+        if account['username'] == username:
+            return account
+    raise Exception(f"Account {username} not found for broker {broker_name}")
+
+
+async def run_order_job(request: dict, broker_name, username):
+    account = await find_account(broker_name, username)
+    tradereq = TradeRequest(**request["tradereq"])
+    return await execute_order_for_account(broker_name, account, tradereq, request["stoploss"], request["takeprofit"])
+
+
+async def run_close_job(request: dict, broker_name, username):
+    account = await find_account(broker_name, username)
+    return await close_positions_for_account(broker_name, account, CloseRequest(**request))
+
+
+job_queue.register("place_order", run_order_job)
+job_queue.register("close_position", run_close_job)
+
+
+async def enqueue_for_accounts(kind: str, request: dict, brokers, symbol: str):
+    accounts = []
+    for broker_name in brokers:
+        accounts.extend((broker_name, account['username']) for account in await account_registry.get_accounts(broker_name))
+    if not accounts:
+        raise HTTPException(status_code=404, detail=f"No accounts found for broker {brokers}")
+    job_id = await job_queue.submit(kind, request, symbol, accounts)
+    return {"message": "Accepted", "job_id": job_id, "tasks": len(accounts)}
+
+
+@router.post("/enqueue/place_order/{api_key}", status_code=202)
+async def enqueue_place_order(tradereq: TradeRequest, api_key: str, idempotency_key_header: str | None = Header(None, alias="Idempotency-Key")):
+    await verify_api_key(api_key)
+    stoploss = await calculate_price_level(tradereq.price, tradereq.stoploss, tradereq.action, 'sl') if tradereq.stoploss else None
+    takeprofit = await calculate_price_level(tradereq.price, tradereq.takeprofit, tradereq.action, 'tp') if tradereq.takeprofit else None
+    request = {"tradereq": tradereq.model_dump(), "stoploss": stoploss, "takeprofit": takeprofit}
+
+    key = idempotency_key("enqueue_place_order", tradereq, idempotency_key_header)
+    return await idempotency.run(
+        key,
+        lambda: enqueue_for_accounts("place_order", request, tradereq.broker, tradereq.symbol),
+        admit=lambda: enforce_rate_limit(api_key, tradereq.strat),
+    )
+
+
+@router.post("/enqueue/close_position/{api_key}", status_code=202)
+async def enqueue_close_position(closereq: CloseRequest, api_key: str, idempotency_key_header: str | None = Header(None, alias="Idempotency-Key")):
+    await verify_api_key(api_key)
+    key = idempotency_key("enqueue_close_position", closereq, idempotency_key_header)
+    return await idempotency.run(key, lambda: enqueue_for_accounts("close_position", closereq.model_dump(), closereq.broker, closereq.symbol))
+
+
+@router.get("/jobs/{job_id}/{api_key}")
+async def job_status(job_id: str, api_key: str):
+    await verify_api_key(api_key)
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {
+        "job_id": job["_id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "pending": job["pending"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "tasks": job["tasks"],
+    }
+
+
 @router.post("/add_account")
 async def add_credentials(cred: credentials, api_key: str ):
     await verify_admin_key(api_key)
     try:
         result = await db.accounts.insert_one(cred.model_dump())
+        account_registry.invalidate()
         return {"message": "Account added successfully", "id": str(result.inserted_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding account: {str(e)}")
@@ -241,6 +568,7 @@ async def delete_account(request: DeleteAccountRequest,api_key: str):
     await verify_admin_key(api_key)
     try:
         result = await db.accounts.delete_one({"username": request.username})
+        account_registry.invalidate()
         if result.deleted_count == 1:
             return {"message": f"Account with username '{request.username}' deleted successfully"}
         else:
@@ -251,10 +579,145 @@ async def delete_account(request: DeleteAccountRequest,api_key: str):
 
         
 @router.post("/add_ticker")
-async def add_credentials(tick: ticker,api_key: str):
+async def add_ticker(tick: ticker,api_key: str):
     await verify_admin_key(api_key)
     try:
-        result = await db.accounts.insert_one(tick.model_dump())
-        return {"message": "Account added successfully", "id": str(result.inserted_id)}
+        doc = tick.model_dump()
+        result = await db.ticker.insert_one(doc)
+        ticker_cache.put(doc)
+        return {"message": "Ticker added successfully", "id": str(result.inserted_id)}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error adding account: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error adding ticker: {str(e)}")
+
+
+@router.post("/reload_tickers")
+async def reload_tickers(api_key: str):
+    await verify_admin_key(api_key)
+    try:
+        await ticker_cache.load()
+        return {"message": "Ticker cache reloaded", "count": len(ticker_cache.tickers)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reloading tickers: {str(e)}")
+
+
+@router.post("/reconcile")
+async def run_reconciliation(api_key: str):
+    await verify_admin_key(api_key)
+    if not await reconciler.lease.acquire():
+        raise HTTPException(status_code=409, detail="Reconciliation runs in another worker")
+    try:
+        return await reconciler.run_once()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reconciling positions: {str(e)}")
+
+
+@router.get("/reconcile/status")
+async def reconciliation_status(api_key: str):
+    await verify_admin_key(api_key)
+    return {"runs": reconciler.runs, "last_run": reconciler.last_run, "lease_held": reconciler.lease.held}
+
+
+@router.get("/analytics/{api_key}")
+async def strategy_analytics(api_key: str, strategy: str | None = None, symbol: str | None = None, start: str | None = None, end: str | None = None):
+    # start and end are YYYY-MM-DD days, both inclusive
+    await verify_api_key(api_key)
+    return {"rollups": await get_rollups(strategy, symbol, start, end)}
+
+
+@router.post("/analytics/backfill")
+async def backfill_analytics(api_key: str):
+    await verify_admin_key(api_key)
+    # Exits still in the write buffer have to be in the trades collection first
+    await trade_writer.flush()
+    return {"rollups": await backfill_rollups()}
+
+
+EXPORT_FIELDS = ["order_id", "username", "broker", "strategy_name", "symbol", "volume", "side", "entry", "exit", "date", "closed_at"]
+
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def parse_export_cursor(after: str):
+    # Cursors are "<date>,<_id>" taken from the last exported row
+    try:
+        date, _, object_id = after.rpartition(",")
+        return datetime.fromisoformat(date), ObjectId(object_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="after must be <date>,<_id> of the last exported trade")
+
+
+@router.get("/export/{api_key}")
+async def export_trades(
+    api_key: str,
+    format: str = "ndjson",
+    fields: str | None = None,
+    strategy: str | None = None,
+    symbol: str | None = None,
+    username: int | None = None,
+    broker: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    after: str | None = None,
+    limit: int = 0,
+):
+    """
+    Stream trades as NDJSON or CSV in (date, _id) order.
+
+    Filters and the projection run on the server and rows are written as the
+    cursor yields them, so memory use does not grow with the export. Every
+    row carries _id and date; pass the last row's "<date>,<_id>" as after to
+    continue from there.
+    """
+    await verify_api_key(api_key)
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+    selected = EXPORT_FIELDS if fields is None else [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in EXPORT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    columns = ["_id"] + selected + ([] if "date" in selected else ["date"])
+
+    query = {}
+    for field, value in (("strategy_name", strategy), ("symbol", symbol), ("username", username), ("broker", broker)):
+        if value is not None:
+            query[field] = value
+    if start or end:
+        query["date"] = {}
+        if start:
+            query["date"]["$gte"] = start
+        if end:
+            query["date"]["$lt"] = end
+    if after:
+        date, object_id = parse_export_cursor(after)
+        keyset = {"$or": [{"date": {"$gt": date}}, {"date": date, "_id": {"$gt": object_id}}]}
+        query = {"$and": [query, keyset]} if query else keyset
+
+    trades = stream_trades(query, {field: 1 for field in columns}, limit)
+
+    async def ndjson():
+        async for trade in trades:
+            yield json.dumps({field: export_value(trade.get(field)) for field in columns}) + "\n"
+
+    async def csv_rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        async for trade in trades:
+            writer.writerow([export_value(trade.get(field)) for field in columns])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    if format == "csv":
+        return StreamingResponse(csv_rows(), media_type="text/csv",
+                                 headers={"Content-Disposition": "attachment; filename=trades.csv"})
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import time
+from typing import List
+from config import settings
+from utils.mongo import get_all_accounts
+
+logger = logging.getLogger(__name__)
+
+
+class AccountRegistry:
+    """
+    Broker accounts grouped by broker name, cached in process.
+
+    The registry is reloaded when it is older than ttl seconds. The admin
+    routes invalidate it directly; other gunicorn workers pick up the change
+    on their next TTL reload.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.accounts = {}
+        self.loaded_at = None
+        self.lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    async def load(self):
+        accounts = await get_all_accounts()
+        by_broker = {}
+        for account in accounts:
+            by_broker.setdefault(account["broker"], []).append(account)
+        self.accounts = by_broker
+        self.loaded_at = time.monotonic()
+        logger.info(f"Loaded {len(accounts)} accounts for {len(by_broker)} brokers")
+
+    async def ensure_loaded(self):
+        if self.is_stale():
+            async with self.lock:
+                # Another request may have reloaded while we waited
+                if self.is_stale():
+                    await self.load()
+
+    async def get_accounts(self, broker: str) -> List[dict]:
+        await self.ensure_loaded()
+        return list(self.accounts.get(broker, []))
+
+    async def get_all_accounts(self) -> List[dict]:
+        await self.ensure_loaded()
+        return [account for accounts in self.accounts.values() for account in accounts]
+
+    def invalidate(self):
+        self.loaded_at = None
+
+
+account_registry = AccountRegistry(settings.account_cache_ttl)
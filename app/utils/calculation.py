@@ -7,6 +7,7 @@ from bson import ObjectId
 from config import settings
 from models.trade_models import TradeRequest
 from typing import List, Dict, Any, Optional
+import numpy as np
     
 
 def is_amount_positive(order_type, stop_type):
@@ -78,14 +79,17 @@ async def reconcile_positions(
         if broker_positions is None:
             
             return db_positions
-        # Create a set of broker deal IDs for faster lookup
-        broker_deals = {pos["deal"] for pos in broker_positions}
+        # Create a set of broker position IDs for faster lookup. A position's
+        # identifier is the ticket of the order that opened it, which is what
+        # the trades collection stores as order_id.
+        broker_deals = {pos["identifier"] for pos in broker_positions}
+        broker_deals.update(pos["ticket"] for pos in broker_positions)
         
         # Find positions that are in DB but not in broker
         missing_positions = []
         
         for db_position in db_positions:
-            deal_id = db_position["orderid"]
+            deal_id = db_position["order_id"]
             
             if deal_id not in broker_deals:
                 missing_positions.append(db_position)
@@ -142,4 +146,54 @@ def calculate_position_size(
         margin_used = recommended_lots * margin_per_lot
         actual_position_value = recommended_lots * contract_value
     
-    return recommended_lots
\ No newline at end of file
+    return recommended_lots
+
+
+def calculate_position_sizes(
+    account_balances: List[float],
+    risk_percentage: float,
+    contract_size: float,
+    margin_percent: float,
+    leverage: float,
+    commission_rate: float,
+    asset_price: float,
+    min_lot_size: float = 0.01
+) -> Dict[str, np.ndarray]:
+    """
+    Vectorized calculate_position_size for every account of a signal in one pass.
+    Values that only depend on the ticker and the signal are computed once, and
+    each account gets exactly the lot size the scalar function would return.
+    """
+    balances = np.asarray(account_balances, dtype=float)
+
+    target_position_value = balances * (risk_percentage / 100)
+
+    contract_value = contract_size * asset_price
+
+    required_lots = target_position_value / contract_value
+
+    # np.round rounds half to even like round() in round_to_nearest_lot
+    recommended_lots = np.round(required_lots / min_lot_size) * min_lot_size
+
+    margin_per_lot = (contract_value * margin_percent / 100)
+
+    margin_used = recommended_lots * margin_per_lot
+
+    actual_position_value = recommended_lots * contract_value
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        effective_leverage = np.where(margin_used > 0, actual_position_value / margin_used, 0)
+
+        # Recalculate lots based on leverage limit where it is exceeded
+        leverage_capped = effective_leverage > leverage
+        max_lots_by_leverage = (balances * leverage) / (contract_value * margin_percent / 100)
+        capped_lots = np.round(np.minimum(required_lots, max_lots_by_leverage) / min_lot_size) * min_lot_size
+
+    lots = np.where(leverage_capped, capped_lots, recommended_lots)
+
+    return {
+        "lots": lots,
+        "margin_used": lots * margin_per_lot,
+        "position_value": lots * contract_value,
+        "leverage_capped": leverage_capped,
+    }
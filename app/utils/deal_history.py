@@ -0,0 +1,58 @@
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+
+class DealHistory:
+    """
+    Incremental cache of one account's deal history.
+
+    The first fetch covers lookback_days; after that only deals newer than
+    the last seen time_msc are requested. history_deals_get filters on whole
+    seconds, so the last second is fetched again and deals already seen in
+    it are skipped by ticket. Each symbol keeps its latest deal and its
+    per_symbol most recent deals, so lookups are constant time and the
+    cache stays bounded.
+    """
+
+    def __init__(self, lookback_days: float, per_symbol: int):
+        self.lookback_days = lookback_days
+        self.per_symbol = per_symbol
+        self.last_time_msc = None
+        self.boundary = {}
+        self.latest_deals = {}
+        self.by_symbol = {}
+
+    def since(self) -> datetime:
+        if self.last_time_msc is None:
+            return datetime.now(timezone.utc) - timedelta(days=self.lookback_days)
+        return datetime.fromtimestamp(self.last_time_msc // 1000, tz=timezone.utc)
+
+    def add(self, deals):
+        for deal in deals:
+            if deal.ticket in self.boundary:
+                continue
+            data = deal._asdict()
+            symbol = data["symbol"]
+            history = self.by_symbol.get(symbol)
+            if history is None:
+                history = self.by_symbol[symbol] = deque(maxlen=self.per_symbol)
+            history.append(data)
+
+            latest = self.latest_deals.get(symbol)
+            if latest is None or data["time_msc"] >= latest["time_msc"]:
+                self.latest_deals[symbol] = data
+            if self.last_time_msc is None or data["time_msc"] > self.last_time_msc:
+                self.last_time_msc = data["time_msc"]
+            self.boundary[deal.ticket] = data["time_msc"]
+
+        # Only tickets from the second that gets fetched again are needed for deduplication
+        if self.last_time_msc is not None:
+            second = self.last_time_msc // 1000
+            self.boundary = {ticket: time_msc for ticket, time_msc in self.boundary.items() if time_msc // 1000 >= second}
+
+    def latest(self, symbol: str) -> Optional[dict]:
+        return self.latest_deals.get(symbol)
+
+    def history(self, symbol: str) -> List[dict]:
+        return list(self.by_symbol.get(symbol, ()))
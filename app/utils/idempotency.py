@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
+from config import settings
+from utils.mongo import db
+
+logger = logging.getLogger(__name__)
+
+
+def idempotency_key(route: str, request: BaseModel, header_key: Optional[str] = None) -> Optional[str]:
+    """
+    Key a webhook delivery on its signal_id or the Idempotency-Key header.
+
+    Deliveries without either are not deduplicated: two identical alerts a
+    minute apart are two real signals, and the payload carries nothing that
+    tells them apart from a retry.
+    """
+    signal_id = getattr(request, "signal_id", None) or header_key
+    return f"{route}:{signal_id}" if signal_id else None
+
+
+class IdempotencyCache:
+    """
+    Deduplicates webhook deliveries for ttl seconds.
+
+    A delivery whose key is already running attaches to the in-flight
+    execution and a finished one gets the stored result back, so retries
+    never reach the broker again. Results live in a bounded in-memory map
+    and in the idempotency collection, which also lets other gunicorn
+    workers recognise a retry. Failed executions are forgotten so the next
+    retry runs normally. An admit callable, such as a rate limit check, runs
+    after the in-memory lookup and before any database work, so it can
+    reject cheaply while retries this worker knows about are never charged.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, wait_timeout: float):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self.entries = OrderedDict()
+        self.hits = 0
+
+    def remember(self, key: str, future):
+        self.entries[key] = (time.monotonic() + self.ttl, future)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def wait_for_other_worker(self, key: str):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+            doc = await db.idempotency.find_one({"_id": key})
+            if doc is None:
+                # The other execution failed, let the caller retry
+                raise HTTPException(status_code=409, detail="Original delivery failed, retry the request")
+            if doc["status"] == "done":
+                return doc["result"]
+        raise HTTPException(status_code=409, detail="Original delivery is still in progress")
+
+    def cached(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            logger.info(f"Duplicate delivery {key}, returning the original result")
+            return entry[1]
+        return None
+
+    async def run(self, key: Optional[str], execute, admit=None):
+        cached = self.cached(key) if key is not None else None
+        if cached is not None:
+            return await asyncio.shield(cached)
+        if admit is not None:
+            await admit()
+        if key is None:
+            return await execute()
+        # A duplicate may have claimed the key while admit was awaited
+        cached = self.cached(key)
+        if cached is not None:
+            return await asyncio.shield(cached)
+
+        # Claim the key before the first await so concurrent duplicates attach to us
+        future = asyncio.get_running_loop().create_future()
+        self.remember(key, future)
+        try:
+            doc = await db.idempotency.find_one({"_id": key})
+            if doc is not None and doc["status"] == "done":
+                self.hits += 1
+                result = doc["result"]
+            else:
+                try:
+                    await db.idempotency.insert_one({"_id": key, "status": "pending", "created_at": datetime.utcnow()})
+                except DuplicateKeyError:
+                    self.hits += 1
+                    result = await self.wait_for_other_worker(key)
+                else:
+                    try:
+                        result = jsonable_encoder(await execute())
+                    except BaseException:
+                        await db.idempotency.delete_one({"_id": key})
+                        raise
+                    try:
+                        await db.idempotency.update_one({"_id": key}, {"$set": {"status": "done", "result": result}})
+                    except Exception as e:
+                        # The orders went through, so never turn this into a failure
+                        logger.error(f"Failed to store idempotency result for {key}: {str(e)}")
+        except BaseException as e:
+            self.entries.pop(key, None)
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody attached to it
+            future.exception()
+            raise
+
+        future.set_result(result)
+        return result
+
+
+idempotency = IdempotencyCache(settings.idempotency_ttl, settings.idempotency_cache_size, settings.idempotency_wait_timeout)
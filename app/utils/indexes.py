@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import logging
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from config import settings
+from utils.mongo import db
+
+logger = logging.getLogger(__name__)
+
+# Open-position lookups are all equality predicates on exit=None, which a
+# partial index cannot express (exit is null, not missing), so exit is
+# indexed as an equality key instead. (symbol, username, exit, strategy_name)
+# serves both the per-symbol and the per-strategy open-position lookups.
+REQUIRED_INDEXES = {
+    "trades": [
+        IndexModel([("symbol", ASCENDING), ("username", ASCENDING), ("exit", ASCENDING), ("strategy_name", ASCENDING)],
+                   name="open_by_symbol_user_strategy"),
+        IndexModel([("username", ASCENDING), ("broker", ASCENDING), ("exit", ASCENDING)],
+                   name="open_by_user_broker"),
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+        IndexModel([("symbol", ASCENDING), ("strategy_name", ASCENDING), ("exit", ASCENDING), ("date", DESCENDING)],
+                   name="latest_by_symbol_strategy"),
+        IndexModel([("date", ASCENDING), ("_id", ASCENDING)], name="export_keyset"),
+    ],
+    "accounts": [
+        IndexModel([("broker", ASCENDING)], name="broker"),
+        IndexModel([("username", ASCENDING)], name="username"),
+    ],
+    "ticker": [
+        IndexModel([("ticker", ASCENDING)], name="ticker"),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING)], name="status"),
+        IndexModel([("tasks.shard", ASCENDING), ("tasks.status", ASCENDING), ("created_at", ASCENDING)],
+                   name="tasks_by_shard"),
+    ],
+    "trade_rollups": [
+        IndexModel([("_id.strategy", ASCENDING), ("_id.symbol", ASCENDING), ("_id.day", ASCENDING)],
+                   name="strategy_symbol_day"),
+    ],
+    "idempotency": [
+        IndexModel([("created_at", ASCENDING)], name="expire_after_ttl", expireAfterSeconds=settings.idempotency_ttl),
+    ],
+}
+
+# The queries on the order path, as issued by utils.mongo and utils.calculation
+HOT_QUERIES = [
+    ("get_open_positions", "trades", {"username": 0, "strategy_name": "", "symbol": "", "exit": None}, None),
+    ("get_open_position_info", "trades", {"symbol": "", "username": 0, "exit": None}, None),
+    ("get_open_positions_from_account", "trades", {"username": 0, "broker": "", "exit": None}, None),
+    ("update_trade_with_exit", "trades", {"order_id": 0}, None),
+    ("get_latest_open_position", "trades", {"symbol": "", "strategy_name": "", "exit": {"$exists": False}}, {"date": -1}),
+    ("get_accounts_for_broker", "accounts", {"broker": ""}, None),
+    ("get_ticker", "ticker", {"ticker": ""}, None),
+]
+
+
+async def ensure_indexes(database=db):
+    """Create any required index that is missing and return the created names."""
+    created = []
+    for collection, indexes in REQUIRED_INDEXES.items():
+        existing = await database[collection].index_information()
+        missing = [index for index in indexes if index.document["name"] not in existing]
+        if missing:
+            created += await database[collection].create_indexes(missing)
+    if created:
+        logger.info(f"Created indexes: {', '.join(created)}")
+    return created
+
+
+def find_stages(plan, stages=None):
+    stages = [] if stages is None else stages
+    stages.append(plan["stage"])
+    for child in plan.get("inputStages", []):
+        find_stages(child, stages)
+    if "inputStage" in plan:
+        find_stages(plan["inputStage"], stages)
+    return stages
+
+
+async def explain_hot_queries(database=db):
+    """Explain every hot query and report which ones still scan the collection."""
+    report = []
+    for name, collection, query, sort in HOT_QUERIES:
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = sort
+        explain = await database.command({"explain": command, "verbosity": "queryPlanner"})
+        stages = find_stages(explain["queryPlanner"]["winningPlan"])
+        report.append({"query": name, "collection": collection, "stages": stages, "collscan": "COLLSCAN" in stages})
+    return report
+
+
+async def main(create: bool):
+    if create:
+        await ensure_indexes()
+    report = await explain_hot_queries()
+    for entry in report:
+        flag = "COLLSCAN" if entry["collscan"] else "ok"
+        print(f"{flag:9} {entry['collection']}.{entry['query']}: {' <- '.join(entry['stages'])}")
+    return 1 if any(entry["collscan"] for entry in report) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the query plans of the hot Mongo queries")
+    parser.add_argument("--create", action="store_true", help="create missing indexes before explaining")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main(args.create)))
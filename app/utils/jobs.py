@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import List
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+from config import settings
+from utils.leases import Lease
+from utils.mongo import db
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Durable queue for webhooks accepted in async mode.
+
+    A job is stored in the jobs collection with one task per account before
+    the webhook is acknowledged. Tasks are spread over a fixed number of
+    shards by (broker, account, symbol). Each shard is run by whichever
+    worker process holds its lease, one task at a time in the order the
+    tasks were accepted, so tasks for the same account and symbol keep their
+    order across gunicorn workers. A shard's tasks are read back from the
+    jobs collection, so queued work survives restarts, and the shards of a
+    process that dies move to another one once its leases expire. Tasks are
+    still claimed in Mongo before they run, so a task never executes twice.
+    On shutdown workers stop claiming tasks and the running ones are given
+    time to finish, so an order is not cut off before its trade is recorded.
+    """
+
+    def __init__(self, shards: int, poll_interval: float, lease_ttl: float, stale_after: float):
+        self.shards = shards
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.leases = [Lease(f"jobs:{shard}", lease_ttl) for shard in range(shards)]
+        self.wakeups = [asyncio.Event() for _ in range(shards)]
+        self.handlers = {}
+        self.tasks = []
+        self.lease_task = None
+        self.stopping = False
+
+    @property
+    def shards_held(self) -> int:
+        return sum(1 for lease in self.leases if lease.held)
+
+    def register(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    def shard(self, broker: str, username, symbol: str) -> int:
+        key = f"{broker}:{username}:{symbol}".encode()
+        return zlib.crc32(key) % self.shards
+
+    async def submit(self, kind: str, request: dict, symbol: str, accounts: List[tuple]) -> str:
+        job_id = uuid.uuid4().hex
+        tasks = [
+            {"broker": broker, "username": username, "shard": self.shard(broker, username, symbol), "status": "queued", "result": None}
+            for broker, username in accounts
+        ]
+        now = datetime.utcnow()
+        await db.jobs.insert_one({
+            "_id": job_id,
+            "kind": kind,
+            "request": jsonable_encoder(request),
+            "symbol": symbol,
+            "status": "queued" if tasks else "done",
+            "pending": len(tasks),
+            "tasks": tasks,
+            "created_at": now,
+            "updated_at": now,
+        })
+        # Shards held here start at once, other workers pick the tasks up on their next poll
+        for shard in {task["shard"] for task in tasks}:
+            self.wakeups[shard].set()
+        return job_id
+
+    async def get(self, job_id: str):
+        return await db.jobs.find_one({"_id": job_id})
+
+    async def next_task(self, shard: int):
+        job = await db.jobs.find_one(
+            {"status": {"$in": ["queued", "running"]}, "tasks": {"$elemMatch": {"shard": shard, "status": "queued"}}},
+            sort=[("created_at", 1), ("_id", 1)],
+        )
+        if job is None:
+            return None
+        for index, task in enumerate(job["tasks"]):
+            if task["shard"] == shard and task["status"] == "queued":
+                return job["_id"], index
+        return None
+
+    async def run_task(self, job_id: str, index: int):
+        # Claim the task so it runs at most once across processes
+        job = await db.jobs.find_one_and_update(
+            {"_id": job_id, f"tasks.{index}.status": "queued"},
+            {"$set": {f"tasks.{index}.status": "running", "status": "running", "updated_at": datetime.utcnow()}},
+        )
+        if job is None:
+            return
+
+        task = job["tasks"][index]
+        try:
+            result = await self.handlers[job["kind"]](job["request"], task["broker"], task["username"])
+            status = "done"
+        except Exception as e:
+            logger.exception(f"Job {job_id} task {index} failed: {e}")
+            result = {"detail": str(e)}
+            status = "failed"
+
+        job = await db.jobs.find_one_and_update(
+            {"_id": job_id},
+            {
+                "$set": {
+                    f"tasks.{index}.status": status,
+                    f"tasks.{index}.result": jsonable_encoder(result),
+                    "updated_at": datetime.utcnow(),
+                },
+                "$inc": {"pending": -1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        await self.finish_if_done(job)
+
+    async def finish_if_done(self, job: dict):
+        if job["pending"] == 0:
+            failed = any(task["status"] != "done" for task in job["tasks"])
+            await db.jobs.update_one({"_id": job["_id"]}, {"$set": {"status": "failed" if failed else "done"}})
+
+    async def worker(self, shard: int):
+        wakeup = self.wakeups[shard]
+        while not self.stopping:
+            task = None
+            if self.leases[shard].held:
+                try:
+                    task = await self.next_task(shard)
+                    if task is not None:
+                        await self.run_task(*task)
+                except Exception as e:
+                    logger.error(f"Job worker error on shard {shard}: {str(e)}")
+            if task is None:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+
+    async def interrupt_stale(self, shards: List[int]):
+        # Tasks left running by a worker that died are not re-sent, since their
+        # orders may already have reached the broker; once the job has been
+        # idle for stale_after seconds they are marked interrupted
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        async for job in db.jobs.find({
+            "status": "running",
+            "updated_at": {"$lt": cutoff},
+            "tasks": {"$elemMatch": {"shard": {"$in": shards}, "status": "running"}},
+        }):
+            for index, task in enumerate(job["tasks"]):
+                if task["shard"] not in shards or task["status"] != "running":
+                    continue
+                updated = await db.jobs.find_one_and_update(
+                    {"_id": job["_id"], f"tasks.{index}.status": "running"},
+                    {"$set": {f"tasks.{index}.status": "interrupted"}, "$inc": {"pending": -1}},
+                    return_document=ReturnDocument.AFTER,
+                )
+                if updated is not None:
+                    logger.warning(f"Job {job['_id']} task {index} was interrupted")
+                    await self.finish_if_done(updated)
+
+    async def hold_leases(self):
+        while True:
+            held = []
+            for shard, lease in enumerate(self.leases):
+                try:
+                    if await lease.acquire():
+                        held.append(shard)
+                except Exception as e:
+                    lease.held = False
+                    logger.error(f"Failed to renew the lease of job shard {shard}: {str(e)}")
+            if held:
+                try:
+                    await self.interrupt_stale(held)
+                except Exception as e:
+                    logger.error(f"Failed to interrupt stale job tasks: {str(e)}")
+            await asyncio.sleep(self.leases[0].ttl / 3)
+
+    def start(self):
+        if self.lease_task is None:
+            self.stopping = False
+            self.lease_task = asyncio.create_task(self.hold_leases())
+            self.tasks = [asyncio.create_task(self.worker(shard)) for shard in range(self.shards)]
+
+    async def stop(self, timeout: float = 20):
+        if self.lease_task is None:
+            return
+        # Stop claiming tasks and let the running ones finish, the leases stay
+        # renewed meanwhile so no other worker takes over their shards
+        self.stopping = True
+        for wakeup in self.wakeups:
+            wakeup.set()
+        _, running = await asyncio.wait(self.tasks, timeout=timeout)
+        if running:
+            logger.warning(f"{len(running)} job tasks still running after {timeout}s, cancelling them")
+        for task in [*running, self.lease_task]:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+        self.lease_task = None
+        for lease in self.leases:
+            try:
+                await lease.release()
+            except Exception as e:
+                logger.error(f"Failed to release job lease {lease.name}: {str(e)}")
+
+
+job_queue = JobQueue(settings.job_workers, settings.job_poll_interval, settings.job_lease_ttl, settings.job_stale_after)
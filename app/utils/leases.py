@@ -0,0 +1,54 @@
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from utils.mongo import db
+
+logger = logging.getLogger(__name__)
+
+INSTANCE = uuid.uuid4().hex[:8]
+
+
+def owner_id() -> str:
+    # The pid keeps forked gunicorn workers apart even when the app was preloaded
+    return f"{socket.gethostname()}:{os.getpid()}:{INSTANCE}"
+
+
+class Lease:
+    """
+    A named lock in the leases collection held by one worker process at a time.
+
+    acquire() takes the lease when it is free or expired and renews it when
+    this process already holds it, so holders call it on every cycle. A
+    holder that dies loses the lease after ttl seconds.
+    """
+
+    def __init__(self, name: str, ttl: float, database=db):
+        self.name = name
+        self.ttl = ttl
+        self.database = database
+        self.held = False
+
+    async def acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.database.leases.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": owner_id()}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": owner_id(), "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+            )
+            held = True
+        except DuplicateKeyError:
+            # Another process holds it, the upsert collided with its document
+            held = False
+        if held != self.held:
+            logger.info(f"{'Acquired' if held else 'Lost'} the {self.name} lease as {owner_id()}")
+        self.held = held
+        return held
+
+    async def release(self):
+        if self.held:
+            await self.database.leases.delete_one({"_id": self.name, "owner": owner_id()})
+            self.held = False
@@ -0,0 +1,188 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds, tuned for webhook stages from sub-millisecond cache hits to slow logins
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                # One slot per bucket plus +Inf, then sum and count
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def drain(self):
+        with self.lock:
+            series, self.series = self.series, {}
+        return series
+
+    def merge(self, delta):
+        with self.lock:
+            for key, values in delta.items():
+                series = self.series.get(key)
+                if series is None:
+                    self.series[key] = list(values)
+                else:
+                    for index, value in enumerate(values):
+                        series[index] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {key: list(series) for key, series in self.series.items()}
+        for key, series in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = format_labels(self.labelnames + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def drain(self):
+        with self.lock:
+            values, self.values = self.values, {}
+        return values
+
+    def merge(self, delta):
+        with self.lock:
+            for key, amount in delta.items():
+                self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            snapshot = dict(self.values)
+        for key, value in snapshot.items():
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name: str, help: str, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def drain(self) -> dict:
+        """Take the counts recorded since the last drain, for another process to merge."""
+        deltas = {}
+        for metric in self.metrics:
+            if hasattr(metric, "drain"):
+                delta = metric.drain()
+                if delta:
+                    deltas[metric.name] = delta
+        return deltas
+
+    def merge(self, deltas: dict):
+        by_name = {metric.name: metric for metric in self.metrics}
+        for name, delta in deltas.items():
+            metric = by_name.get(name)
+            if metric is not None and hasattr(metric, "merge"):
+                metric.merge(delta)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "webhook_stage_seconds",
+    "Time spent per stage of the order and close paths",
+    ("stage", "broker", "account", "symbol", "outcome"),
+))
+order_retries = registry.register(Counter(
+    "mt5_order_retries_total",
+    "order_send attempts after the first one",
+    ("operation", "account", "symbol"),
+))
+relogins = registry.register(Counter(
+    "mt5_relogins_total",
+    "MT5 logins performed by the session manager",
+    ("account",),
+))
+
+
+class StageTimer:
+    __slots__ = ("outcome",)
+
+    def __init__(self):
+        self.outcome = "ok"
+
+
+@contextmanager
+def timed(stage: str, broker="", account="", symbol=""):
+    """Time a block into webhook_stage_seconds; set .outcome to label the result."""
+    timer = StageTimer()
+    start = time.perf_counter()
+    try:
+        yield timer
+    except BaseException:
+        timer.outcome = "error"
+        raise
+    finally:
+        stage_seconds.observe(
+            time.perf_counter() - start,
+            stage=stage, broker=broker, account=account, symbol=symbol, outcome=timer.outcome,
+        )
@@ -1,6 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic_settings import BaseSettings
+from pymongo.monitoring import ConnectionPoolListener
 import logging
+import threading
 from config import settings
 import datetime
 from typing import List, Dict
@@ -11,24 +12,112 @@ from models.trade_models import Trades, ticker
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-mongo_uri = settings.mongo_uri
-db_name = settings.mongo_db_name
-client = AsyncIOMotorClient(mongo_uri)
-db = client[db_name]
+class PoolStats(ConnectionPoolListener):
+    """
+    Connection pool counters for every server the client talks to.
+
+    checked_out is the number of connections lent to operations right now and
+    waiters the number of operations queued for one; the peaks show how close
+    a signal burst came to exhausting maxPoolSize.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pools = {}
+
+    def pool(self, address):
+        key = f"{address[0]}:{address[1]}"
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {
+                "connections": 0, "checked_out": 0, "waiters": 0,
+                "max_checked_out": 0, "max_waiters": 0, "check_out_failures": 0, "cleared": 0,
+            }
+        return pool
+
+    def update(self, event, **changes):
+        with self.lock:
+            pool = self.pool(event.address)
+            for name, delta in changes.items():
+                pool[name] += delta
+            pool["max_checked_out"] = max(pool["max_checked_out"], pool["checked_out"])
+            pool["max_waiters"] = max(pool["max_waiters"], pool["waiters"])
+
+    def pool_created(self, event):
+        self.update(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.update(event, cleared=1)
+
+    def pool_closed(self, event):
+        with self.lock:
+            self.pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        self.update(event, connections=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.update(event, connections=-1)
+
+    def connection_check_out_started(self, event):
+        self.update(event, waiters=1)
+
+    def connection_check_out_failed(self, event):
+        self.update(event, waiters=-1, check_out_failures=1)
+
+    def connection_checked_out(self, event):
+        self.update(event, waiters=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self.update(event, checked_out=-1)
+
+    def snapshot(self):
+        with self.lock:
+            return {address: dict(pool) for address, pool in self.pools.items()}
+
+    def total(self, name: str) -> int:
+        with self.lock:
+            return sum(pool[name] for pool in self.pools.values())
 
-class MongoSettings(BaseSettings):
-    uri: str = settings.mongo_uri
-    db_name: str = settings.mongo_db_name
 
+pool_stats = PoolStats()
 
-settings = MongoSettings()
+
+def create_client() -> AsyncIOMotorClient:
+    """Build the Mongo client from Settings; the app shares the one created below."""
+    write_concern = int(settings.mongo_write_concern) if settings.mongo_write_concern.isdigit() else settings.mongo_write_concern
+    return AsyncIOMotorClient(
+        settings.mongo_uri,
+        maxPoolSize=settings.mongo_max_pool_size,
+        minPoolSize=settings.mongo_min_pool_size,
+        maxIdleTimeMS=settings.mongo_max_idle_time_ms,
+        waitQueueTimeoutMS=settings.mongo_wait_queue_timeout_ms,
+        serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
+        connectTimeoutMS=settings.mongo_connect_timeout_ms,
+        socketTimeoutMS=settings.mongo_socket_timeout_ms or None,
+        w=write_concern,
+        readConcernLevel=settings.mongo_read_concern,
+        readPreference=settings.mongo_read_preference,
+        event_listeners=[pool_stats],
+    )
+
+
+db_name = settings.mongo_db_name
+client = create_client()
+db = client[db_name]
 
 
 class MongoDB:
-    def __init__(self, uri: str, db_name: str):
-        self.client = AsyncIOMotorClient(uri)
+    def __init__(self, client: AsyncIOMotorClient, db_name: str):
+        self.client = client
         self.database = self.client[db_name]
-        logger.info(f"Connected to MongoDB at {uri}")
+        logger.info(f"Using MongoDB database {db_name}")
 
     def get_database(self):
         return self.database
@@ -38,13 +127,17 @@ class MongoDB:
         self.client.close()
 
 
-mongo = MongoDB(settings.uri, settings.db_name)
+mongo = MongoDB(client, db_name)
 
 async def get_accounts_for_broker(broker: str) -> List[dict]:
     # Fetch accounts for the specified broker from the database
     cursor = db.accounts.find({"broker": broker})
     return await cursor.to_list(length=None)
 
+async def get_all_accounts() -> List[dict]:
+    cursor = db.accounts.find({"broker": {"$exists": True}, "username": {"$exists": True}})
+    return await cursor.to_list(length=None)
+
 async def get_open_positions(username: int, strategy: str, symbol: str) -> List[Trades]:
     cursor = db.trades.find({
         "username": username,
@@ -73,6 +166,14 @@ async def get_open_position_info( symbol: str, username: str) -> str:
     else:
         return None
     
+async def get_all_open_positions() -> List[dict]:
+    cursor = db.trades.find({"exit": None})
+    return await cursor.to_list(length=None)
+
+async def find_open_positions(query: dict) -> List[dict]:
+    cursor = db.trades.find({**query, "exit": None})
+    return await cursor.to_list(length=None)
+
 async def get_open_positions_from_account(username: int, broker_name: str) -> List[Trades]:
     try:
         cursor = db.trades.find({
@@ -88,11 +189,23 @@ async def get_open_positions_from_account(username: int, broker_name: str) -> Li
     except Exception as e:
         logger.error(f"Error querying open positions: {str(e)}")
         raise
-async def get_ticker(ticker: str) -> List[ticker]:
+async def get_ticker(ticker: str) -> dict:
     try:
-        cursor = db.ticker.find({"ticker": ticker,})
-        return cursor
-        
+        return await db.ticker.find_one({"ticker": ticker})
+
     except Exception as e:
-        logger.error(f"Error querying open positions: {str(e)}")
+        logger.error(f"Error querying ticker {ticker}: {str(e)}")
         raise
+
+async def get_all_tickers(limit: int = 0) -> List[dict]:
+    cursor = db.ticker.find({}, limit=limit)
+    return await cursor.to_list(length=None)
+
+async def stream_trades(query: dict, projection: dict, limit: int = 0, batch_size: int = 500):
+    # Yield trades in (date, _id) order one batch at a time instead of materialising the result
+    cursor = db.trades.find(query, projection, limit=limit).sort([("date", 1), ("_id", 1)]).batch_size(batch_size)
+    try:
+        async for trade in cursor:
+            yield trade
+    finally:
+        await cursor.close()
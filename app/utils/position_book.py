@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+from config import settings
+from utils.mongo import find_open_positions, get_all_open_positions
+
+logger = logging.getLogger(__name__)
+
+
+class PositionBook:
+    """
+    In-memory book of open trades.
+
+    Trades are indexed by order_id, (username, symbol),
+    (username, strategy, symbol) and (username, broker) so the order path can
+    decide same side / flip / ignore without a database round trip. The book
+    is loaded from the trades collection at startup, updated as trades are
+    opened and closed, and reloaded every refresh_interval seconds. A trade
+    opened by another worker since the last reload is not in the book yet,
+    so the find_* lookups fall back to the trades collection on a miss.
+    Trades closed here are remembered until the next reload, because their
+    exit may still be waiting in the write-behind buffer.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.by_order = {}
+        self.by_symbol = {}
+        self.by_strategy = {}
+        self.by_account = {}
+        self.closed = {}
+        self.journal = None
+        self.task = None
+
+    def add(self, trade: dict):
+        order_id = trade["order_id"]
+        self.by_order[order_id] = trade
+        self.by_symbol.setdefault((trade["username"], trade["symbol"]), {})[order_id] = trade
+        self.by_strategy.setdefault((trade["username"], trade["strategy_name"], trade["symbol"]), {})[order_id] = trade
+        self.by_account.setdefault((trade["username"], trade["broker"]), {})[order_id] = trade
+
+    def remove(self, order_id) -> Optional[dict]:
+        trade = self.by_order.pop(order_id, None)
+        if trade is None:
+            return None
+        for index, key in (
+            (self.by_symbol, (trade["username"], trade["symbol"])),
+            (self.by_strategy, (trade["username"], trade["strategy_name"], trade["symbol"])),
+            (self.by_account, (trade["username"], trade["broker"])),
+        ):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(order_id, None)
+                if not bucket:
+                    del index[key]
+        return trade
+
+    def open(self, trade: dict):
+        if self.journal is not None:
+            self.journal.append(("open", trade))
+        self.add(trade)
+
+    def close(self, order_id) -> Optional[dict]:
+        if self.journal is not None:
+            self.journal.append(("close", order_id))
+        self.closed[order_id] = time.monotonic()
+        return self.remove(order_id)
+
+    def get_position(self, username, symbol) -> Optional[dict]:
+        bucket = self.by_symbol.get((username, symbol))
+        return next(iter(bucket.values())) if bucket else None
+
+    def get_positions(self, username, strategy: str, symbol: str) -> List[dict]:
+        return list(self.by_strategy.get((username, strategy, symbol), {}).values())
+
+    def get_account_positions(self, username, broker: str) -> List[dict]:
+        return list(self.by_account.get((username, broker), {}).values())
+
+    async def fetch(self, query: dict) -> List[dict]:
+        # Open trades matching query in the trades collection, added to the book
+        found = []
+        for trade in await find_open_positions(query):
+            order_id = trade["order_id"]
+            if order_id in self.closed:
+                continue
+            if order_id not in self.by_order:
+                self.add(trade)
+            found.append(self.by_order[order_id])
+        return found
+
+    async def find_position(self, username, symbol) -> Optional[dict]:
+        position = self.get_position(username, symbol)
+        if position is None:
+            found = await self.fetch({"username": username, "symbol": symbol})
+            position = found[0] if found else None
+        return position
+
+    async def find_positions(self, username, strategy: str, symbol: str) -> List[dict]:
+        positions = self.get_positions(username, strategy, symbol)
+        if not positions:
+            positions = await self.fetch({"username": username, "strategy_name": strategy, "symbol": symbol})
+        return positions
+
+    async def load(self):
+        # Record local changes made while the query runs and replay them on top
+        self.journal = []
+        try:
+            trades = await get_all_open_positions()
+        except Exception:
+            self.journal = None
+            raise
+        journal, self.journal = self.journal, None
+
+        # Closes older than a refresh interval have been flushed before this load
+        cutoff = time.monotonic() - self.refresh_interval
+        self.closed = {order_id: closed_at for order_id, closed_at in self.closed.items() if closed_at > cutoff}
+        trades = [trade for trade in trades if trade["order_id"] not in self.closed]
+        self.by_order, self.by_symbol, self.by_strategy, self.by_account = {}, {}, {}, {}
+        for trade in trades:
+            self.add(trade)
+        for action, item in journal:
+            if action == "open":
+                self.add(item)
+            else:
+                self.remove(item)
+        logger.info(f"Loaded {len(self.by_order)} open positions")
+
+    async def refresh_loop(self, before_load=None):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if before_load is not None:
+                    await before_load()
+                await self.load()
+            except Exception as e:
+                logger.error(f"Position book refresh failed: {str(e)}")
+
+    def start(self, before_load=None):
+        if self.task is None:
+            self.task = asyncio.create_task(self.refresh_loop(before_load))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+position_book = PositionBook(settings.position_book_refresh_interval)
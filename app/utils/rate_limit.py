@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from config import settings
+from utils.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+rate_limited = registry.register(Counter(
+    "rate_limited_total",
+    "Requests and account orders rejected by the rate limiter",
+    ("scope",),
+))
+
+UNITS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+
+def parse_rate(value: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Parse "N/unit" (e.g. 10/second, 300/minute) into (burst capacity, tokens per second)."""
+    if not value or not value.strip():
+        return None
+    count, _, unit = value.strip().partition("/")
+    unit = unit.strip().lower() or "second"
+    if unit not in UNITS and unit.endswith("s"):
+        unit = unit[:-1]
+    try:
+        capacity = float(count)
+        seconds = UNITS[unit]
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid rate limit {value!r}, expected something like 10/second")
+    return capacity, capacity / seconds
+
+
+class MemoryBuckets:
+    """Token buckets for one process, bounded to max_keys least recently used keys."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+
+    def take(self, items) -> float:
+        # Either every bucket gives a token or none does; returns the wait until all could
+        now = time.monotonic()
+        levels = []
+        retry_after = 0.0
+        for key, capacity, rate in items:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            levels.append((key, tokens))
+            if tokens < 1:
+                retry_after = max(retry_after, (1 - tokens) / rate)
+        if retry_after:
+            return retry_after
+
+        for key, tokens in levels:
+            self.buckets[key] = (tokens - 1, now)
+            self.buckets.move_to_end(key)
+        # An evicted key simply starts again with a full bucket
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return 0.0
+
+
+class SqliteBuckets:
+    """
+    Token buckets in a local SQLite file shared by every gunicorn worker.
+
+    Each take runs in one IMMEDIATE transaction so workers never hand out
+    the same token twice, which can wait up to a second for another
+    worker's lock, so takes run off the event loop. Buckets idle for longer
+    than the largest rate period are full again and get pruned.
+    """
+
+    PRUNE_EVERY = 10000
+    blocking = True
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=1, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+        self.takes = 0
+
+    def take(self, items) -> float:
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                levels = []
+                retry_after = 0.0
+                for key, capacity, rate in items:
+                    row = self.conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                    tokens, updated = row if row else (capacity, now)
+                    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+                    levels.append((key, tokens))
+                    if tokens < 1:
+                        retry_after = max(retry_after, (1 - tokens) / rate)
+                if not retry_after:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                        [(key, tokens - 1, now) for key, tokens in levels],
+                    )
+                    self.takes += 1
+                    if self.takes % self.PRUNE_EVERY == 0:
+                        self.conn.execute("DELETE FROM buckets WHERE updated < ?", (now - max(UNITS.values()),))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return retry_after
+
+
+class RateLimiter:
+    """
+    Token-bucket limits per API key, strategy and broker account.
+
+    Each scope has its own "N/unit" limit from settings, where N is also
+    the burst size; scopes without a limit are not checked. A check only
+    consumes tokens when every bucket involved has one. If the shared store
+    fails, requests are let through rather than blocking trading.
+    """
+
+    def __init__(self, limits: dict, store):
+        self.limits = {scope: parse_rate(value) for scope, value in limits.items()}
+        self.store = store
+
+    @property
+    def enabled(self) -> bool:
+        return any(self.limits.values())
+
+    async def check(self, **keys) -> float:
+        """Take one token for each given scope; returns 0 when allowed, else seconds to wait."""
+        items = [
+            (f"{scope}:{value}", *self.limits[scope])
+            for scope, value in keys.items()
+            if value is not None and self.limits.get(scope)
+        ]
+        if not items:
+            return 0.0
+        try:
+            if self.store.blocking:
+                retry_after = await asyncio.get_running_loop().run_in_executor(None, self.store.take, items)
+            else:
+                retry_after = self.store.take(items)
+        except sqlite3.Error as e:
+            logger.error(f"Rate limit store failed, allowing request: {str(e)}")
+            return 0.0
+        if retry_after:
+            rate_limited.inc(scope="+".join(keys))
+        return retry_after
+
+
+rate_limiter = RateLimiter(
+    {
+        "api_key": settings.rate_limit,
+        "strategy": settings.rate_limit_strategy,
+        "account": settings.rate_limit_account,
+    },
+    SqliteBuckets(settings.rate_limit_store) if settings.rate_limit_store else MemoryBuckets(settings.rate_limit_max_keys),
+)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from config import settings
+from models.brokers import BROKERS, create_broker
+from utils.account_registry import account_registry
+from utils.leases import Lease
+from utils.mongo import get_open_positions_from_account
+from utils.position_book import position_book
+from utils.write_behind import trade_writer
+
+logger = logging.getLogger(__name__)
+
+# Exit value recorded when the broker no longer has the closing deal
+UNKNOWN_EXIT = "reconciled"
+
+
+class Reconciler:
+    """
+    Periodically closes out trades the broker no longer holds.
+
+    SL/TP hits on the broker side never reach the trades collection, so each
+    run compares the open trades of an account with its live MT5 positions
+    and records exits for the ones that disappeared. Runs are incremental:
+    each one takes the next batch_size accounts in round-robin order and
+    reconciles them concurrently.
+
+    Only the worker holding the reconciler lease runs, so web workers sharing
+    a terminal do not all log into every account. Each account's live
+    positions and exit prices are read in one call, so a reconciliation
+    costs one login that the session manager serialises with orders.
+    """
+
+    def __init__(self, interval: float, batch_size: int, concurrency: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.offset = 0
+        self.runs = 0
+        self.last_run = None
+        self.lease = Lease("reconciler", max(3 * interval, 30))
+        self.task = None
+
+    async def reconcile_account(self, account: dict) -> int:
+        username = account["username"]
+        broker_name = account["broker"]
+        db_positions = await get_open_positions_from_account(username, broker_name)
+        if not db_positions:
+            # Nothing to reconcile, skip the broker round trip
+            return 0
+
+        broker = await create_broker(broker_name, username, account["password"], account["server"])
+        closed = await broker.get_closed_positions([trade["order_id"] for trade in db_positions])
+        if closed is None:
+            raise Exception(f"Could not read live positions for account {username}")
+
+        missing = [trade for trade in db_positions if trade["order_id"] in closed]
+        if not missing:
+            return 0
+
+        for trade in missing:
+            exit_price = closed[trade["order_id"]]
+            if exit_price is None:
+                exit_price = UNKNOWN_EXIT
+            # Only the book's copy feeds the rollup, a trade it no longer holds
+            # has already had its exit recorded
+            trade_writer.update_trade_exit(trade["order_id"], exit_price, position_book.close(trade["order_id"]))
+        logger.info(f"Reconciled {len(missing)} closed positions for account {username} on {broker_name}")
+        return len(missing)
+
+    async def run_once(self):
+        started = time.perf_counter()
+        # The database has to reflect every trade this worker already recorded
+        await trade_writer.flush()
+
+        accounts = [account for account in await account_registry.get_all_accounts() if account["broker"] in BROKERS]
+        accounts.sort(key=lambda account: (account["broker"], account["username"]))
+        if accounts:
+            self.offset %= len(accounts)
+            batch = (accounts[self.offset:] + accounts[:self.offset])[:self.batch_size]
+            self.offset += len(batch)
+        else:
+            batch = []
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(account):
+            async with semaphore:
+                try:
+                    return await self.reconcile_account(account)
+                except Exception as e:
+                    logger.error(f"Reconciliation failed for account {account['username']}: {str(e)}")
+                    return None
+
+        results = await asyncio.gather(*(run(account) for account in batch))
+        await trade_writer.flush()
+
+        drift = {
+            f"{account['broker']}:{account['username']}": count
+            for account, count in zip(batch, results) if count
+        }
+        self.runs += 1
+        self.last_run = {
+            "finished_at": datetime.utcnow().isoformat(),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "accounts_checked": len(batch),
+            "accounts_total": len(accounts),
+            "errors": sum(1 for count in results if count is None),
+            "positions_closed": sum(drift.values()),
+            "drift": drift,
+        }
+        logger.info(
+            f"Reconciliation run {self.runs}: {self.last_run['accounts_checked']} accounts, "
+            f"{self.last_run['positions_closed']} positions closed in {self.last_run['duration_ms']} ms"
+        )
+        return self.last_run
+
+    async def loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if not await self.lease.acquire():
+                    continue
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Reconciliation run failed: {str(e)}")
+
+    def start(self):
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.create_task(self.loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            await self.lease.release()
+        except Exception as e:
+            logger.error(f"Failed to release the reconciler lease: {str(e)}")
+
+
+reconciler = Reconciler(settings.reconcile_interval, settings.reconcile_batch_size, settings.reconcile_concurrency)
@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import UpdateOne
+from utils.mongo import db
+from utils.ticker_cache import ticker_cache
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "trade_rollups"
+
+# Rollups are keyed by strategy, symbol and the day the trade was closed.
+# Each document holds running sums (trades, wins, pnl, holding_seconds) so
+# an exit is a single $inc; win rate and average holding time are derived
+# when the rollups are read. PnL is (exit - entry) * direction * volume *
+# contract size. Exits without a price (reconciled without a closing deal)
+# are left out.
+
+
+def rollup_key(strategy_name: str, symbol: str, closed_at: datetime) -> dict:
+    return {"strategy": strategy_name, "symbol": symbol, "day": closed_at.strftime("%Y-%m-%d")}
+
+
+def realized_pnl(trade: dict, exit_price: float, contract: float) -> float:
+    direction = 1 if trade["side"] == "buy" else -1
+    return (exit_price - trade["entry"]) * direction * trade["volume"] * contract
+
+
+def rollup_update(trade: dict, exit_price, closed_at: datetime) -> Optional[UpdateOne]:
+    """The rollup increment for one closed trade, or None when the exit has no price."""
+    if isinstance(exit_price, bool) or not isinstance(exit_price, (int, float)):
+        return None
+    spec = ticker_cache.peek(trade["symbol"])
+    contract = spec["contract"] if spec else 1
+    pnl = realized_pnl(trade, exit_price, contract)
+    opened_at = trade.get("date")
+    if isinstance(opened_at, datetime):
+        # Trade dates are naive local time, closed_at is naive UTC
+        opened_at = opened_at.astimezone(timezone.utc).replace(tzinfo=None)
+        holding = (closed_at - opened_at).total_seconds()
+    else:
+        holding = 0.0
+    return UpdateOne(
+        {"_id": rollup_key(trade["strategy_name"], trade["symbol"], closed_at)},
+        {"$inc": {"trades": 1, "wins": 1 if pnl > 0 else 0, "pnl": pnl, "holding_seconds": holding}},
+        upsert=True,
+    )
+
+
+BACKFILL_PIPELINE = [
+    {"$match": {"exit": {"$type": "number"}}},
+    {"$lookup": {"from": "ticker", "localField": "symbol", "foreignField": "ticker", "as": "spec"}},
+    {"$set": {
+        "contract": {"$ifNull": [{"$arrayElemAt": ["$spec.contract", 0]}, 1]},
+        "closed": {"$ifNull": ["$closed_at", "$date"]},
+        "direction": {"$cond": [{"$eq": ["$side", "buy"]}, 1, -1]},
+    }},
+    {"$set": {
+        "pnl": {"$multiply": [{"$subtract": ["$exit", "$entry"]}, "$direction", "$volume", "$contract"]},
+        "holding": {"$divide": [{"$subtract": ["$closed", "$date"]}, 1000]},
+    }},
+    {"$group": {
+        "_id": {
+            "strategy": "$strategy_name",
+            "symbol": "$symbol",
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$closed"}},
+        },
+        "trades": {"$sum": 1},
+        "wins": {"$sum": {"$cond": [{"$gt": ["$pnl", 0]}, 1, 0]}},
+        "pnl": {"$sum": "$pnl"},
+        "holding_seconds": {"$sum": "$holding"},
+    }},
+    {"$merge": {"into": ROLLUP_COLLECTION, "whenMatched": "replace", "whenNotMatched": "insert"}},
+]
+
+
+async def backfill_rollups(database=db) -> int:
+    """Rebuild the rollups from every closed trade on the server and return the rollup count."""
+    async for _ in database.trades.aggregate(BACKFILL_PIPELINE, allowDiskUse=True):
+        pass
+    count = await database[ROLLUP_COLLECTION].count_documents({})
+    logger.info(f"Backfilled {count} trade rollups")
+    return count
+
+
+async def get_rollups(strategy: Optional[str] = None, symbol: Optional[str] = None,
+                      start: Optional[str] = None, end: Optional[str] = None, database=db):
+    query = {}
+    if strategy:
+        query["_id.strategy"] = strategy
+    if symbol:
+        query["_id.symbol"] = symbol
+    if start or end:
+        query["_id.day"] = {}
+        if start:
+            query["_id.day"]["$gte"] = start
+        if end:
+            query["_id.day"]["$lte"] = end
+
+    rollups = []
+    cursor = database[ROLLUP_COLLECTION].find(query).sort([("_id.strategy", 1), ("_id.symbol", 1), ("_id.day", 1)])
+    async for rollup in cursor:
+        trades = rollup["trades"]
+        rollups.append({
+            **rollup["_id"],
+            "trades": trades,
+            "wins": rollup["wins"],
+            "win_rate": rollup["wins"] / trades if trades else 0.0,
+            "pnl": rollup["pnl"],
+            "avg_holding_seconds": rollup["holding_seconds"] / trades if trades else 0.0,
+        })
+    return rollups
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the trade rollups from the trades collection")
+    parser.parse_args()
+    print(f"Backfilled {asyncio.run(backfill_rollups())} trade rollups")
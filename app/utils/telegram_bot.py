@@ -1,10 +1,161 @@
-import requests
+import asyncio
+import logging
+import random
+import httpx
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramNotifier:
+    """
+    Background queue that delivers Telegram messages off the order path.
+
+    Callers only enqueue. A single worker drains the queue in order, merges
+    consecutive messages for the same chat into as few sendMessage calls as
+    possible (and waits batch_window seconds to collect more while Telegram
+    is rate limiting), and retries with exponential backoff. When the queue is full new
+    messages are dropped and counted rather than blocking the caller.
+    """
+
+    def __init__(self, max_queue: int, batch_window: float, max_retries: int, timeout: float):
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.client = None
+        self.task = None
+        self.next_item = None
+        self.rate_limited_until = 0.0
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def enqueue(self, bot_token, channel_id, message):
+        try:
+            self.queue.put_nowait((bot_token, channel_id, message))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Telegram queue full, dropped message ({self.dropped} dropped so far)")
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "sent": self.sent,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def take_batch(self, first):
+        # Pull the run of queued messages for the same chat into one batch; the
+        # first message for another chat is kept back to start the next batch
+        bot_token, channel_id, message = first
+        messages = [message]
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item[:2] != (bot_token, channel_id):
+                self.next_item = item
+                break
+            messages.append(item[2])
+        return bot_token, channel_id, messages
+
+    def chunk(self, messages):
+        chunks, current = [], ""
+        for message in messages:
+            message = message.strip()[:MAX_MESSAGE_LENGTH]
+            if current and len(current) + len(message) + 2 > MAX_MESSAGE_LENGTH:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{message}" if current else message
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def send(self, bot_token, channel_id, text):
+        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+        payload = {
+            "chat_id": channel_id,
+            "text": text
+        }
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries):
+            try:
+                response = await self.client.post(url, json=payload)
+                if response.status_code == 429:
+                    retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+                    self.rate_limited_until = loop.time() + retry_after
+                    logger.warning(f"Telegram rate limited, retrying in {retry_after}s")
+                    await asyncio.sleep(retry_after)
+                    continue
+                response.raise_for_status()
+                self.sent += 1
+                return True
+            except httpx.HTTPError as e:
+                delay = min(2 ** attempt, 30) + random.uniform(0, 0.5)
+                logger.warning(f"Telegram send failed on attempt {attempt + 1}: {str(e)}")
+                await asyncio.sleep(delay)
+        self.failed += 1
+        logger.error("Giving up on Telegram message after retries")
+        return False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.next_item is not None:
+                first, self.next_item = self.next_item, None
+            else:
+                first = await self.queue.get()
+            if loop.time() < self.rate_limited_until + self.batch_window:
+                # While Telegram throttles us, let the burst build up and send it merged
+                await asyncio.sleep(self.batch_window)
+            bot_token, channel_id, messages = self.take_batch(first)
+            chunks = self.chunk(messages)
+            self.merged += len(messages) - len(chunks)
+            for text in chunks:
+                try:
+                    await self.send(bot_token, channel_id, text)
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Telegram notification failed: {str(e)}")
+
+    def start(self):
+        if self.task is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout, limits=httpx.Limits(max_connections=4))
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 5):
+        if self.task is None:
+            return
+        # Give queued messages a short grace period before shutting down
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (not self.queue.empty() or self.next_item is not None) and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        await self.client.aclose()
+
+
+notifier = TelegramNotifier(
+    settings.telegram_queue_size,
+    settings.telegram_batch_window,
+    settings.telegram_max_retries,
+    settings.telegram_timeout,
+)
+
 
 async def send_telegram_trade_signal(bot_token, channel_id, strategy_name, symbol, side, entry_price, order_id):
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    
     message = f"""
-  Trade Signal Alert 
+  Trade Signal Alert
 
 Strategy: {strategy_name}
 Symbol: {symbol}
@@ -13,20 +164,13 @@ Entry Price: {entry_price}
 Order ID: {order_id}
 
 """
-    
-    payload = {
-        "chat_id": channel_id,
-        "text": message
-    }
-    
-    requests.post(url, json=payload)
+
+    notifier.enqueue(bot_token, channel_id, message)
 
 
 async def send_telegram_close_signal(bot_token, channel_id, strategy_name, symbol, side, exit_price):
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    
     message = f"""
-  EXIT Signal Alert 
+  EXIT Signal Alert
 
 Strategy: {strategy_name}
 Symbol: {symbol}
@@ -34,10 +178,5 @@ Side: {side.upper()}
 Exit Price: {exit_price}
 
 """
-    
-    payload = {
-        "chat_id": channel_id,
-        "text": message
-    }
-    
-    requests.post(url, json=payload)
\ No newline at end of file
+
+    notifier.enqueue(bot_token, channel_id, message)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import NamedTuple, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Quote(NamedTuple):
+    bid: float
+    ask: float
+    fetched_at: float
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def price(self, side: str) -> Optional[float]:
+        if side.lower() == 'buy':
+            return self.ask
+        if side.lower() == 'sell':
+            return self.bid
+        return None
+
+
+class QuoteCache:
+    """
+    Shared bid/ask cache keyed by (server, symbol).
+
+    Every account on the same server sees the same quotes, so one terminal
+    round trip serves all of them. Symbols that were quoted recently are kept
+    fresh by a background task; symbols nobody asked for within idle_timeout
+    stop being refreshed. The refresh only fetches quotes that have gone
+    stale and yields to orders and logins: while busy() reports work waiting
+    for the terminal it skips its turn and backs off up to max_backoff.
+    """
+
+    def __init__(self, refresh_interval: float, idle_timeout: float, max_backoff: float):
+        self.refresh_interval = refresh_interval
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+        self.quotes = {}
+        self.watched = {}
+        self.lock = threading.Lock()
+        self.task = None
+
+    def get(self, server: str, symbol: str, max_age: float) -> Optional[Quote]:
+        quote = self.quotes.get((server, symbol))
+        if quote is None or quote.age() > max_age:
+            return None
+        return quote
+
+    def put(self, server: str, symbol: str, bid: float, ask: float) -> Quote:
+        quote = Quote(float(bid), float(ask), time.monotonic())
+        self.quotes[(server, symbol)] = quote
+        return quote
+
+    def watch(self, server: str, symbol: str):
+        with self.lock:
+            self.watched[(server, symbol)] = time.monotonic()
+
+    def stale_keys(self):
+        # Forget symbols that have not been used for a while, skip quotes an
+        # order fetched since the last round
+        now = time.monotonic()
+        keys = []
+        with self.lock:
+            for key, last_used in list(self.watched.items()):
+                if now - last_used > self.idle_timeout:
+                    del self.watched[key]
+                    self.quotes.pop(key, None)
+                    continue
+                quote = self.quotes.get(key)
+                if quote is None or quote.age() >= self.refresh_interval:
+                    keys.append(key)
+        return keys
+
+    async def refresh_loop(self, refresh, busy):
+        delay = self.refresh_interval
+        while True:
+            await asyncio.sleep(delay)
+            if busy():
+                delay = min(delay * 2, self.max_backoff)
+                continue
+            delay = self.refresh_interval
+            keys = self.stale_keys()
+            if keys:
+                try:
+                    await refresh(keys)
+                except Exception as e:
+                    logger.error(f"Quote refresh failed: {str(e)}")
+
+    def start(self, refresh, busy):
+        if self.task is None:
+            self.task = asyncio.create_task(self.refresh_loop(refresh, busy))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+quote_cache = QuoteCache(settings.quote_refresh_interval, settings.quote_idle_timeout, settings.quote_refresh_max_backoff)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+from config import settings
+from utils.mongo import get_ticker, get_all_tickers
+
+logger = logging.getLogger(__name__)
+
+
+class TickerCache:
+    """
+    Process-local cache of ticker specs (contract, margin, leverage, commission).
+
+    Specs almost never change, so they are loaded once at startup, kept as a
+    bounded LRU and reloaded from Mongo every refresh_interval seconds. The
+    admin routes write through the cache so changes show up immediately in
+    the worker that handled them.
+    """
+
+    def __init__(self, max_size: int, refresh_interval: float):
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+        self.tickers = OrderedDict()
+        self.task = None
+
+    def put(self, ticker: dict):
+        symbol = ticker["ticker"]
+        self.tickers[symbol] = ticker
+        self.tickers.move_to_end(symbol)
+        while len(self.tickers) > self.max_size:
+            self.tickers.popitem(last=False)
+
+    def invalidate(self, symbol: Optional[str] = None):
+        if symbol is None:
+            self.tickers.clear()
+        else:
+            self.tickers.pop(symbol, None)
+
+    async def load(self):
+        tickers = await get_all_tickers(limit=self.max_size)
+        self.tickers.clear()
+        for ticker in tickers:
+            self.put(ticker)
+        logger.info(f"Loaded {len(self.tickers)} ticker specs")
+
+    def peek(self, symbol: str) -> Optional[dict]:
+        # Cached spec only, for callers that cannot wait on Mongo
+        return self.tickers.get(symbol)
+
+    async def get(self, symbol: str) -> Optional[dict]:
+        ticker = self.tickers.get(symbol)
+        if ticker is not None:
+            self.tickers.move_to_end(symbol)
+            return ticker
+
+        ticker = await get_ticker(symbol)
+        if ticker is not None:
+            self.put(ticker)
+        return ticker
+
+    async def refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Ticker cache refresh failed: {str(e)}")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.refresh_loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+ticker_cache = TickerCache(settings.ticker_cache_size, settings.ticker_refresh_interval)
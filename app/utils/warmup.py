@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from config import settings
+from models.brokers import BROKERS, create_broker, run_in_mt5, session_manager
+from models.terminal_pool import terminal_pool
+from utils.account_registry import account_registry
+from utils.indexes import ensure_indexes
+from utils.mongo import db
+from utils.position_book import position_book
+from utils.ticker_cache import ticker_cache
+
+logger = logging.getLogger(__name__)
+
+# Data the order path cannot work without; a failed index bootstrap is only logged
+REQUIRED_STEPS = ("mongo_pool", "tickers", "accounts", "positions")
+PRELOAD_STEPS = ("indexes",) + REQUIRED_STEPS
+RETRY_MAX_DELAY = 30
+
+
+class Warmup:
+    """
+    Prepares a worker before it takes traffic.
+
+    preload() opens the Mongo pool and loads tickers, accounts and open
+    positions in parallel; startup awaits it so no request sees empty
+    caches. When one of them fails, for example while Mongo is unreachable,
+    the worker still starts but reports failed, and start() retries the
+    failed steps in the background with backoff. Once they succeed it
+    initialises every MT5 terminal and the worker reports ready once that
+    finishes or timeout seconds have passed.
+
+    A terminal holds one login at a time, so logging in more accounts than
+    terminals only leaves the last one warm. Of the configured accounts
+    (none, all or a comma-separated list of usernames) at most one per
+    terminal is logged in, the rest are reported as skipped. Accounts that
+    are skipped or fail to log in log in on their first order instead.
+    """
+
+    def __init__(self, accounts: str, timeout: float):
+        self.accounts = accounts.strip().lower()
+        self.timeout = timeout
+        self.state = "starting"
+        self.steps = {}
+        self.logins = {"ok": 0, "failed": [], "skipped": 0}
+        self.started_at = time.perf_counter()
+        self.ready_at = None
+        self.task = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    async def step(self, name: str, work):
+        started = time.perf_counter()
+        try:
+            await work
+            self.steps[name] = {"ok": True}
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            logger.error(f"Warm-up step {name} failed: {error}")
+            self.steps[name] = {"ok": False, "error": error}
+        self.steps[name]["ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def open_pool(self):
+        # Concurrent pings make the driver open that many connections up front
+        await asyncio.gather(*(db.command("ping") for _ in range(max(1, settings.mongo_min_pool_size))))
+
+    def preload_work(self, name: str):
+        if name == "indexes":
+            return ensure_indexes()
+        if name == "mongo_pool":
+            return self.open_pool()
+        if name == "tickers":
+            return ticker_cache.load()
+        if name == "accounts":
+            return account_registry.load()
+        return position_book.load()
+
+    async def preload(self, names=PRELOAD_STEPS) -> bool:
+        self.state = "preloading"
+        await asyncio.gather(*(self.step(name, self.preload_work(name)) for name in names))
+        failed = [name for name in REQUIRED_STEPS if not self.steps[name]["ok"]]
+        if failed:
+            self.state = "failed"
+            logger.error(f"Warm-up could not load {', '.join(failed)}, retrying in the background")
+        return not failed
+
+    async def retry_preload(self):
+        delay = 1
+        while True:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+            if await self.preload([name for name in PRELOAD_STEPS if not self.steps[name]["ok"]]):
+                return
+
+    def selected(self, account: dict) -> bool:
+        if self.accounts == "all":
+            return True
+        if self.accounts in ("", "none"):
+            return False
+        return str(account["username"]) in {username.strip() for username in self.accounts.split(",")}
+
+    async def initialize_terminals(self):
+        if terminal_pool.enabled:
+            results = await asyncio.gather(
+                *(terminal_pool.call_terminal(terminal, None, "initialize") for terminal in terminal_pool.terminals),
+                return_exceptions=True,
+            )
+        else:
+            results = [await run_in_mt5(session_manager.initialize)]
+        failed = [index for index, result in enumerate(results) if result is not True]
+        if failed:
+            raise RuntimeError(f"MT5 terminals {failed} did not initialise")
+
+    def terminal_index(self, account: dict) -> int:
+        if terminal_pool.enabled:
+            return terminal_pool.terminal_for(account["username"], account["server"]).index
+        return 0
+
+    async def login_accounts(self):
+        accounts = {}
+        for account in await account_registry.get_all_accounts():
+            if account["broker"] not in BROKERS or not self.selected(account):
+                continue
+            index = self.terminal_index(account)
+            if index in accounts:
+                self.logins["skipped"] += 1
+                continue
+            accounts[index] = account
+        accounts = list(accounts.values())
+
+        async def login(account):
+            broker = await create_broker(account["broker"], account["username"], account["password"], account["server"])
+            return await broker.connect()
+
+        results = await asyncio.gather(*(login(account) for account in accounts), return_exceptions=True)
+        for account, result in zip(accounts, results):
+            if result is True:
+                self.logins["ok"] += 1
+            else:
+                self.logins["failed"].append(f"{account['broker']}:{account['username']}")
+
+    async def run(self):
+        if self.state == "failed":
+            await self.retry_preload()
+        self.state = "logging_in"
+        try:
+            deadline = time.perf_counter() + self.timeout
+            await self.step("terminals", asyncio.wait_for(self.initialize_terminals(), self.timeout))
+            await self.step("logins", asyncio.wait_for(self.login_accounts(), max(0, deadline - time.perf_counter())))
+        finally:
+            self.state = "ready"
+            self.ready_at = datetime.utcnow().isoformat()
+            logger.info(
+                f"Warm-up done in {time.perf_counter() - self.started_at:.1f}s, "
+                f"{self.logins['ok']} accounts logged in, {len(self.logins['failed'])} failed, "
+                f"{self.logins['skipped']} skipped"
+            )
+
+    def start(self):
+        if self.task is None:
+            if self.state != "failed":
+                self.state = "logging_in"
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def status(self):
+        return {"state": self.state, "ready_at": self.ready_at, "steps": self.steps, "logins": self.logins}
+
+
+warmup = Warmup(settings.warmup_accounts, settings.warmup_timeout)
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from datetime import datetime
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from config import settings
+from utils.metrics import timed
+from utils.mongo import db
+from utils.rollups import ROLLUP_COLLECTION, rollup_update
+
+logger = logging.getLogger(__name__)
+
+
+class TradeWriter:
+    """
+    Write-behind buffer for trade inserts, exit updates and rollups.
+
+    Writes are queued in call order and sent as ordered bulk_write batches,
+    either when batch_size operations are pending or every flush_interval
+    seconds. Callers that need to read their own writes await flush().
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def enqueue(self, collection: str, operation):
+        self.pending.append((collection, operation))
+        if len(self.pending) >= self.batch_size:
+            self.wakeup.set()
+
+    def insert_trade(self, trade: dict):
+        self.enqueue("trades", InsertOne(trade))
+
+    def update_trade_exit(self, order_id: int, exit_price, trade: dict = None):
+        closed_at = datetime.utcnow()
+        self.enqueue("trades", UpdateOne(
+            {"order_id": order_id},
+            {"$set": {"exit": exit_price, "closed_at": closed_at}}
+        ))
+        # Fold the closed trade into its strategy/symbol/day rollup in the same batch
+        if trade is not None:
+            rollup = rollup_update(trade, exit_price, closed_at)
+            if rollup is not None:
+                self.enqueue(ROLLUP_COLLECTION, rollup)
+
+    async def write_batch(self, batch):
+        # bulk_write works per collection, so send consecutive runs in order
+        index = 0
+        while index < len(batch):
+            collection = batch[index][0]
+            end = index
+            while end < len(batch) and batch[end][0] == collection:
+                end += 1
+            operations = [operation for _, operation in batch[index:end]]
+            try:
+                with timed("mongo_bulk_write"):
+                    await db[collection].bulk_write(operations, ordered=True)
+            except BulkWriteError as e:
+                # Ordered writes stop at the first failure: drop it, retry the rest
+                error = e.details["writeErrors"][0]
+                logger.error(f"Dropping failed {collection} write: {error.get('errmsg')}")
+                return batch[index + error["index"] + 1:]
+            except Exception:
+                return batch[index:]
+            index = end
+        return []
+
+    async def flush(self):
+        async with self.lock:
+            while self.pending:
+                batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+                remaining = await self.write_batch(batch)
+                if remaining:
+                    self.pending = remaining + self.pending
+                    if len(remaining) == len(batch):
+                        logger.error(f"Trade write batch failed, {len(self.pending)} writes pending")
+                        return
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Trade write flush failed: {str(e)}")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+
+trade_writer = TradeWriter(settings.write_batch_size, settings.write_flush_interval)
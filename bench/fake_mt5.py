@@ -0,0 +1,237 @@
+"""
+Stand-in for the MetaTrader5 package used by the benchmark.
+
+It keeps the same module-level, single terminal API as the real package and
+simulates one logged in account at a time, per-account balances, open
+positions and deal history. Call latency, rejected orders and requotes are
+set with configure() so the routes can be measured under terminal
+conditions that are hard to reproduce against a live broker.
+"""
+import random
+import threading
+import time
+from collections import namedtuple
+
+TRADE_ACTION_DEAL = 1
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+ORDER_TIME_GTC = 0
+ORDER_FILLING_IOC = 1
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_DONE_PARTIAL = 10010
+TRADE_RETCODE_ERROR = 10011
+TRADE_RETCODE_TIMEOUT = 10012
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_PRICE = 10015
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_TRADE_DISABLED = 10017
+TRADE_RETCODE_MARKET_CLOSED = 10018
+TRADE_RETCODE_NO_MONEY = 10019
+TRADE_RETCODE_PRICE_CHANGED = 10020
+TRADE_RETCODE_PRICE_OFF = 10021
+TRADE_RETCODE_TOO_MANY_REQUESTS = 10024
+TRADE_RETCODE_LOCKED = 10028
+TRADE_RETCODE_FROZEN = 10029
+TRADE_RETCODE_CONNECTION = 10031
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+TerminalInfo = namedtuple("TerminalInfo", "connected trade_allowed")
+AccountInfo = namedtuple("AccountInfo", "login balance equity server")
+Tick = namedtuple("Tick", "time bid ask last volume time_msc")
+OrderSendResult = namedtuple("OrderSendResult", "retcode deal order volume price bid ask comment request_id")
+TradePosition = namedtuple("TradePosition", "ticket identifier time_msc type magic volume price_open sl tp profit symbol comment")
+TradeDeal = namedtuple("TradeDeal", "ticket order time time_msc type entry magic position_id volume price profit symbol comment")
+
+config = {
+    "latency": 0.0,          # seconds added to order_send
+    "tick_latency": 0.0,     # seconds added to symbol_info_tick
+    "login_latency": 0.0,    # seconds added to login
+    "reject_rate": 0.0,      # share of order_send calls rejected outright
+    "requote_rate": 0.0,     # share of order_send calls answered with a requote
+    "lost_reply_rate": 0.0,  # share of opens that fill but return nothing
+    "balance": 10000.0,
+    "spread": 0.0002,
+}
+
+lock = threading.RLock()
+rng = random.Random(0)
+state = {"initialized": False, "login": None, "server": None, "ticket": 0, "error": (1, "Success")}
+positions = {}   # login -> {ticket: TradePosition}
+deals = {}       # login -> [TradeDeal]
+prices = {}      # symbol -> mid price
+stats = {"order_send": 0, "rejected": 0, "requotes": 0, "invalid_volume": 0, "lost_replies": 0, "logins": 0}
+
+
+def configure(seed=None, **options):
+    unknown = set(options) - set(config)
+    if unknown:
+        raise ValueError(f"Unknown fake MT5 options: {sorted(unknown)}")
+    config.update(options)
+    if seed is not None:
+        rng.seed(seed)
+
+
+def reset():
+    with lock:
+        state.update(initialized=False, login=None, server=None, ticket=0, error=(1, "Success"))
+        positions.clear()
+        deals.clear()
+        prices.clear()
+        for key in stats:
+            stats[key] = 0
+
+
+def pause(seconds):
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def next_ticket():
+    state["ticket"] += 1
+    return state["ticket"]
+
+
+def quote(symbol):
+    # Random walk around 1.0 so requotes and slippage have something to move
+    mid = prices.get(symbol, 1.0) * (1 + rng.uniform(-0.0001, 0.0001))
+    prices[symbol] = mid
+    half = config["spread"] / 2
+    return mid - half, mid + half
+
+
+def initialize(*args, **kwargs):
+    with lock:
+        state["initialized"] = True
+        return True
+
+
+def shutdown():
+    with lock:
+        state.update(initialized=False, login=None, server=None)
+
+
+def login(login, password=None, server=None, timeout=None):
+    pause(config["login_latency"])
+    with lock:
+        if not state["initialized"]:
+            state["error"] = (-10004, "No IPC connection")
+            return False
+        state.update(login=login, server=server)
+        stats["logins"] += 1
+        return True
+
+
+def last_error():
+    return state["error"]
+
+
+def terminal_info():
+    return TerminalInfo(True, True) if state["initialized"] else None
+
+
+def account_info():
+    if state["login"] is None:
+        return None
+    return AccountInfo(state["login"], config["balance"], config["balance"], state["server"])
+
+
+def symbol_info_tick(symbol):
+    pause(config["tick_latency"])
+    with lock:
+        if not state["initialized"]:
+            return None
+        bid, ask = quote(symbol)
+        now = time.time()
+        return Tick(int(now), bid, ask, 0.0, 0, int(now * 1000))
+
+
+def result(retcode, request, price=0.0, deal=0, order=0, comment=""):
+    bid, ask = quote(request["symbol"])
+    return OrderSendResult(retcode, deal, order, request.get("volume", 0.0), price, bid, ask, comment, 0)
+
+
+def order_send(request):
+    pause(config["latency"])
+    with lock:
+        if state["login"] is None:
+            state["error"] = (-10004, "No IPC connection")
+            return None
+        stats["order_send"] += 1
+        if request.get("volume", 0.0) <= 0:
+            stats["invalid_volume"] += 1
+            return result(TRADE_RETCODE_INVALID_VOLUME, request, comment="Invalid volume")
+        draw = rng.random()
+        if draw < config["reject_rate"]:
+            stats["rejected"] += 1
+            return result(TRADE_RETCODE_REJECT, request, comment="Request rejected")
+        if draw < config["reject_rate"] + config["requote_rate"]:
+            stats["requotes"] += 1
+            return result(TRADE_RETCODE_REQUOTE, request, comment="Requote")
+
+        login = state["login"]
+        now = time.time()
+        book = positions.setdefault(login, {})
+        history = deals.setdefault(login, [])
+        price = request["price"]
+        if request.get("position"):
+            position = book.pop(request["position"], None)
+            if position is None:
+                return result(TRADE_RETCODE_POSITION_CLOSED, request, comment="Position doesn't exist")
+            direction = 1 if position.type == ORDER_TYPE_BUY else -1
+            profit = round((price - position.price_open) * direction * position.volume * 100000, 2)
+            ticket = next_ticket()
+            history.append(TradeDeal(ticket, ticket, int(now), int(now * 1000), request["type"], DEAL_ENTRY_OUT,
+                                     request.get("magic", 0), position.ticket, position.volume, price, profit,
+                                     position.symbol, request.get("comment", "")))
+            return result(TRADE_RETCODE_DONE, request, price, deal=ticket, order=ticket)
+
+        ticket = next_ticket()
+        book[ticket] = TradePosition(ticket, ticket, int(now * 1000), request["type"], request.get("magic", 0),
+                                     request["volume"], price, request.get("sl") or 0.0, request.get("tp") or 0.0,
+                                     0.0, request["symbol"], request.get("comment", ""))
+        history.append(TradeDeal(ticket, ticket, int(now), int(now * 1000), request["type"], DEAL_ENTRY_IN,
+                                 request.get("magic", 0), ticket, request["volume"], price, 0.0,
+                                 request["symbol"], request.get("comment", "")))
+        if rng.random() < config["lost_reply_rate"]:
+            stats["lost_replies"] += 1
+            state["error"] = (-10004, "No IPC connection")
+            return None
+        return result(TRADE_RETCODE_DONE, request, price, deal=ticket, order=ticket)
+
+
+def positions_total():
+    return len(positions.get(state["login"], {}))
+
+
+def positions_get(symbol=None, ticket=None, **kwargs):
+    with lock:
+        if state["login"] is None:
+            return None
+        found = positions.get(state["login"], {}).values()
+        if symbol is not None:
+            found = [position for position in found if position.symbol == symbol]
+        if ticket is not None:
+            found = [position for position in found if position.ticket == ticket]
+        return tuple(found)
+
+
+def history_deals_get(date_from=None, date_to=None, position=None, **kwargs):
+    with lock:
+        if state["login"] is None:
+            return None
+        found = deals.get(state["login"], [])
+        if position is not None:
+            return tuple(deal for deal in found if deal.position_id == position)
+        if date_from is not None:
+            start = date_from.timestamp() if hasattr(date_from, "timestamp") else date_from
+            found = [deal for deal in found if deal.time >= int(start)]
+        if date_to is not None:
+            end = date_to.timestamp() if hasattr(date_to, "timestamp") else date_to
+            found = [deal for deal in found if deal.time <= end]
+        return tuple(found)
@@ -0,0 +1,273 @@
+"""
+Benchmark the order and close routes without live terminals.
+
+The app runs in-process with the MetaTrader5 module replaced by fake_mt5
+and MongoDB replaced by mongomock (or a local mongod with --mongo-uri).
+Each of the M signals fans out to all N accounts through
+/trade/place_order, then every signal is closed again through
+/trade/close_position. Latency percentiles, throughput and the per-stage
+means from the /metrics histograms are printed and saved as JSON.
+
+    python bench/run.py --accounts 20 --signals 50 --latency 0.02
+    python bench/run.py --accounts 20 --signals 50 --compare bench/results/baseline.json
+
+With --compare the run exits with status 1 when a latency percentile grows
+or a throughput figure drops by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+API_KEY = "bench-api-key"
+ADMIN_KEY = "bench-admin-key"
+SYMBOL = "EURUSD"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark place_order and close_position against a fake MT5 terminal")
+    parser.add_argument("--accounts", type=int, default=10, help="accounts per signal (N)")
+    parser.add_argument("--signals", type=int, default=20, help="signals to place and close (M)")
+    parser.add_argument("--concurrency", type=int, default=1, help="signals in flight at once")
+    parser.add_argument("--sequential", action="store_true", help="use the single-account order path instead of fan-out")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every order_send")
+    parser.add_argument("--tick-latency", type=float, default=0.0, help="seconds added to every symbol_info_tick")
+    parser.add_argument("--login-latency", type=float, default=0.0, help="seconds added to every login")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="share of order_send calls rejected")
+    parser.add_argument("--requote-rate", type=float, default=0.0, help="share of order_send calls requoted")
+    parser.add_argument("--lost-reply-rate", type=float, default=0.0, help="share of opens that fill but return nothing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongo-uri", help="run against this MongoDB instead of mongomock")
+    parser.add_argument("--output", help="result file, defaults to bench/results/<timestamp>.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression for --compare")
+    return parser.parse_args()
+
+
+def prepare_environment(args):
+    # Settings are read at import time, so everything has to be in place before the app is imported
+    os.environ.setdefault("MONGO_URI", args.mongo_uri or "mongodb://localhost:27017")
+    os.environ.setdefault("MONGO_DB_NAME", f"bench_{os.getpid()}" if args.mongo_uri else "bench")
+    for name, value in (
+        ("ENCRYPTION_KEY", "bench"), ("SECRET", "bench"), ("HOST_URL", "http://bench"),
+        ("TG_TOKEN", "bench"), ("CHAN_ID", "bench"), ("RATE_LIMIT", ""),
+        ("API_KEY", API_KEY), ("ADMIN_API_KEY", ADMIN_KEY),
+    ):
+        os.environ.setdefault(name, value)
+
+    sys.path.insert(0, BENCH_DIR)
+    sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+    import fake_mt5
+    fake_mt5.configure(
+        seed=args.seed,
+        latency=args.latency,
+        tick_latency=args.tick_latency,
+        login_latency=args.login_latency,
+        reject_rate=args.reject_rate,
+        requote_rate=args.requote_rate,
+        lost_reply_rate=args.lost_reply_rate,
+    )
+    sys.modules["MetaTrader5"] = fake_mt5
+
+    if not args.mongo_uri:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        # utils.mongo builds the app's one client when it is imported, hand it an in-memory server
+        shared = AsyncMongoMockClient()
+        motor.motor_asyncio.AsyncIOMotorClient = lambda *a, **k: shared
+    return fake_mt5
+
+
+def summarize(latencies, completed, elapsed):
+    values = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "orders": completed,
+        "elapsed_s": round(elapsed, 4),
+        "orders_per_s": round(completed / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(float(np.percentile(values, 50)), 3) if len(values) else None,
+        "p95_ms": round(float(np.percentile(values, 95)), 3) if len(values) else None,
+        "p99_ms": round(float(np.percentile(values, 99)), 3) if len(values) else None,
+        "max_ms": round(float(values.max()), 3) if len(values) else None,
+    }
+
+
+def stage_summary():
+    from utils.metrics import stage_seconds
+    stages = {}
+    with stage_seconds.lock:
+        series = {key: list(values) for key, values in stage_seconds.series.items()}
+    for key, values in series.items():
+        stage = stages.setdefault(key[0], {"count": 0, "total_s": 0.0})
+        stage["count"] += values[-1]
+        stage["total_s"] += values[-2]
+    return {
+        name: {"count": stage["count"], "mean_ms": round(stage["total_s"] / stage["count"] * 1000, 3)}
+        for name, stage in sorted(stages.items())
+    }
+
+
+async def drive(client, requests, concurrency):
+    """Send the requests with at most concurrency in flight; return latencies and responses."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    responses = []
+
+    async def send(path, params, body):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, params=params, json=body)
+            latencies.append(time.perf_counter() - started)
+            responses.append(response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(*request) for request in requests))
+    return latencies, responses, time.perf_counter() - started
+
+
+async def run_benchmark(args):
+    import httpx
+    import main
+    from utils.telegram_bot import notifier
+    from utils.write_behind import trade_writer
+
+    app = main.app
+    for handler in app.router.on_startup:
+        await handler()
+    # Notifications are still queued and merged, only the Telegram API is answered locally
+    await notifier.client.aclose()
+    notifier.client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"ok": True})))
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            admin = {"api_key": ADMIN_KEY}
+            for username in range(1, args.accounts + 1):
+                response = await client.post("/trade/add_account", params=admin, json={
+                    "broker": "MT5", "username": username, "password": "bench", "server": "Bench-Server",
+                })
+                response.raise_for_status()
+            response = await client.post("/trade/add_ticker", params=admin, json={
+                "ticker": SYMBOL, "broker": "MT5", "margin": 1, "contract": 100000, "leverage": 100,
+            })
+            response.raise_for_status()
+
+            # 10% of the 10000 balance over a 100000 contract sizes each order to one 0.01 lot
+            params = {"fanout": "false" if args.sequential else "true"}
+            place = [
+                (f"/trade/place_order/{API_KEY}", params, {
+                    "broker": ["MT5"], "strat": f"bench-{signal}", "symbol": SYMBOL, "volume": 10,
+                    "action": "buy", "price": 1.0, "signal_id": f"bench-open-{signal}",
+                })
+                for signal in range(args.signals)
+            ]
+            latencies, responses, elapsed = await drive(client, place, args.concurrency)
+            filled = 0
+            for response in responses:
+                if response.status_code == 200:
+                    body = response.json()
+                    filled += body["filled"] if "filled" in body else 1
+            place_summary = summarize(latencies, filled, elapsed)
+            place_summary["errors"] = sum(1 for response in responses if response.status_code != 200)
+
+            await trade_writer.flush()
+            close = [
+                (f"/trade/close_position/{API_KEY}", None, {
+                    "broker": ["MT5"], "strategy_name": f"bench-{signal}", "symbol": SYMBOL,
+                    "side": "buy", "signal_id": f"bench-close-{signal}",
+                })
+                for signal in range(args.signals)
+            ]
+            open_before = sum(len(book) for book in sys.modules["MetaTrader5"].positions.values())
+            latencies, responses, elapsed = await drive(client, close, args.concurrency)
+            open_after = sum(len(book) for book in sys.modules["MetaTrader5"].positions.values())
+            close_summary = summarize(latencies, open_before - open_after, elapsed)
+            close_summary["errors"] = sum(1 for response in responses if response.status_code != 200)
+    finally:
+        for handler in app.router.on_shutdown:
+            await handler()
+
+    return {"place_order": place_summary, "close_position": close_summary, "stages": stage_summary()}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """Print the differences to the baseline and return the regressions beyond tolerance."""
+    regressions = []
+    print(f"\n{'metric':<34}{'baseline':>12}{'current':>12}{'change':>10}")
+    for phase in ("place_order", "close_position"):
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "orders_per_s"):
+            old = baseline.get(phase, {}).get(metric)
+            new = current[phase].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            print(f"{phase + '.' + metric:<34}{old:>12.3f}{new:>12.3f}{change:>+10.1%}")
+            worse = -change if metric == "orders_per_s" else change
+            if worse > tolerance:
+                regressions.append(f"{phase}.{metric} {change:+.1%}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    fake = prepare_environment(args)
+
+    results = asyncio.run(run_benchmark(args))
+    results["meta"] = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "mongo": "mongod" if args.mongo_uri else "mongomock",
+        "accounts": args.accounts,
+        "signals": args.signals,
+        "concurrency": args.concurrency,
+        "fanout": not args.sequential,
+        "fake_mt5": dict(fake.config),
+        "fake_mt5_stats": dict(fake.stats),
+    }
+
+    for phase in ("place_order", "close_position"):
+        summary = results[phase]
+        print(
+            f"{phase:<16} {summary['orders']} orders in {summary['elapsed_s']}s "
+            f"({summary['orders_per_s']}/s)  p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  "
+            f"p99 {summary['p99_ms']} ms  errors {summary['errors']}"
+        )
+    for stage, summary in results["stages"].items():
+        print(f"  {stage:<20} {summary['count']:>7}  mean {summary['mean_ms']} ms")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions beyond tolerance: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,4 +8,10 @@ if ! command -v wine &> /dev/null; then
 fi
 
 # Start gunicorn
-gunicorn -w 4 -k uvicorn.workers.UvicornWorker main:app
\ No newline at end of file
+# One web worker owns the MT5 terminal: without MT5_TERMINAL_PATHS it drives
+# the single terminal in-process, with them it starts the terminal pool. More
+# workers would switch each other's terminal logins or start pools of their
+# own, so scale with terminals. WEB_WORKERS overrides this; orders still
+# confirm their account before order_send, but workers sharing a terminal keep
+# logging each other out.
+gunicorn -w ${WEB_WORKERS:-1} -k uvicorn.workers.UvicornWorker main:app
\ No newline at end of file